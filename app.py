@@ -5,14 +5,16 @@ def _needs_pillarbox(w, h):
     # treat anything not close to 16:9 as needing pillarbox
     return (abs(w * 9 - h * 16) > 8)
 # -*- coding: utf-8 -*-
-import os, time, threading, subprocess, shutil, glob, json, mimetypes
+import os, time, threading, subprocess, shutil, json, mimetypes
 import sys
 from datetime import datetime
-from flask import Flask, request, redirect, url_for, send_file, abort, jsonify, render_template_string
+from flask import Flask, request, redirect, url_for, send_file, abort, jsonify
+from markupsafe import Markup
 import pytz
-import subprocess
 import io, zipfile
 from os.path import basename
+from urllib.parse import quote
+from collections import OrderedDict
 from lcd_hat import UI
 
 # ---------- Hotspot / AP control (NetworkManager) ----------
@@ -34,6 +36,7 @@ def _nmcli(*args, timeout=6):
     except Exception as e:
         return False, str(e)
 import re
+import functools
 
 def _lcd_is_active():
     try:
@@ -55,6 +58,32 @@ def _lcd_service(action):
     except Exception:
         pass
 
+# The network probes below each fork nmcli/iw/ip/hostname; the index page and
+# /ap/status call several per render, so results are reused for a couple of seconds.
+_NET_TTL = 2.0
+_net_caches = []
+
+def _ttl_cached(fn):
+    cache = {}   # args -> (monotonic ts, result)
+    _net_caches.append(cache)
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        now = time.monotonic()
+        hit = cache.get(args)
+        if hit and now - hit[0] < _NET_TTL:
+            return hit[1]
+        result = fn(*args)
+        cache[args] = (now, result)
+        return result
+    return wrapper
+
+def _invalidate_net_caches():
+    """Call after toggling the hotspot so status reflects it immediately."""
+    for cache in _net_caches:
+        cache.clear()
+
+@_ttl_cached
 def _ap_ssid(dev):
     # 1) From the live device (most reliable for active AP)
     if dev:
@@ -80,6 +109,7 @@ def _ap_ssid(dev):
 
     return None # No SSID found
 
+@_ttl_cached
 def _ap_active_device():
     """Return the device name (e.g. wlan0) for the active AP, or ''."""
     ok, out = _nmcli("con", "show", "--active")
@@ -94,6 +124,7 @@ def _ap_active_device():
                 return parts[-1]  # DEVICE col
     return ""
 
+@_ttl_cached
 def _ipv4_for_device(dev):
     """Return the first IPv4 address for a given device, or ''."""
     if not dev:
@@ -110,6 +141,7 @@ def _ipv4_for_device(dev):
         pass
     return ""
 
+@_ttl_cached
 def _all_ipv4_local():
     """Return a list of local IPv4 addresses (best-effort)."""
     try:
@@ -123,6 +155,7 @@ def _all_ipv4_local():
         pass
     return []
 
+@_ttl_cached
 def _ap_is_active():
     # Fast check: is our AP connection currently active?
     ok, out = _nmcli("con", "show", "--active")
@@ -185,35 +218,24 @@ def _ensure_dirs(base_root: str):
 
 BASE, SESSIONS_DIR, STILLS_DIR = _ensure_dirs(BASE)
 STILLS_DIR = os.path.join(BASE, "stills")
+# rpicam-still writes raw timelapse frames here (RAM-backed), so SD-card
+# writeback stalls can't delay capture. /dev/shm is capped at ~half of RAM;
+# only a few frames are ever in flight since each is removed once processed.
+RAW_TMPFS = os.environ.get("MOUSEYE_RAW_TMPFS", "/dev/shm/mouseye")
 LCD_OFF_FLAG = os.path.join(BASE, "lcd_off.flag")
 LCD_HIDE_SPLASH_FLAG = os.path.join(BASE, "lcd_hide_splash.flag")
 
-# Helpers to control the LCD systemd service (used around encoding)
-def _lcd_is_active():
-    try:
-        p = subprocess.run(["systemctl", "is-active", "--quiet", "timelapse-lcd.service"],
-                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=1.5)
-        return (p.returncode == 0)
-    except Exception:
-        return False
-
-
-def _lcd_service(action):
-    # action should be 'stop' or 'start'
-    try:
-        subprocess.run(["sudo", "systemctl", action, "timelapse-lcd.service"],
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=3)
-    except Exception:
-        pass
-LCD_HIDE_SPLASH_FLAG = os.path.join(BASE, "lcd_hide_splash.flag")
-
 CAMERA_STILL = shutil.which("rpicam-still") or "/usr/bin/rpicam-still"
 FFMPEG       = shutil.which("ffmpeg") or "/usr/bin/ffmpeg"
+CAMERA_VID   = shutil.which("rpicam-vid") or shutil.which("libcamera-vid")   # None if neither
+# Background-priority prefix for encodes; tolerant if ionice/nice are not installed
+LOW_PRIO = ((["ionice", "-c3"] if shutil.which("ionice") else [])
+            + (["nice", "-n", "19"] if shutil.which("nice") else []))
 PREFS_FILE = os.path.join(BASE, "lcd_prefs.json")
 
 def _get_background_status():
     """Checks for active background jobs and returns a status string."""
-    for job in _jobs.values():
+    for job in _jobs_snapshot().values():
         status = job.get("status", "")
         if status == "encoding":
             return "Status: Encoding..."
@@ -308,10 +330,11 @@ def _rotate_still_to_canonical(path: str):
         print(f"[_rotate_still_to_canonical] failed for {path}: {e}")
 
 # --- Helper: Rotate from src_path to dst_path atomically (for timelapse) ---
-def _rotate_copy_to(src_path: str, dst_path: str, deg: int = None):
+def _rotate_copy_to(src_path: str, dst_path: str, deg: int = None, quality: int = None):
     """
     Read JPEG at src_path, rotate CCW (deg or UI policy), normalize EXIF,
-    and atomically replace dst_path. Creates parent directory for dst if needed.
+    and atomically replace dst_path at `quality` (Pillow's default if None).
+    Creates parent directory for dst if needed.
     """
     try:
         os.makedirs(os.path.dirname(dst_path), exist_ok=True)
@@ -326,10 +349,15 @@ def _rotate_copy_to(src_path: str, dst_path: str, deg: int = None):
             exif = im.getexif()
             exif[ORIENT_TAG] = 1
             tmp = dst_path + ".tmp"
-            im.save(tmp, format="JPEG", exif=exif)
+            if quality:
+                im.save(tmp, format="JPEG", exif=exif, quality=int(quality))
+            else:
+                im.save(tmp, format="JPEG", exif=exif)
             os.replace(tmp, dst_path)  # atomic
+        return True
     except Exception as e:
         print(f"[_rotate_copy_to] failed from {src_path} -> {dst_path}: {e}")
+        return False
 
 def _downscale_copy_to(src_path: str, dst_path: str, size: tuple = None):
     """
@@ -377,6 +405,8 @@ CAPTURE_INTERVAL_SEC = 10
 CAPTURE_WIDTH   = "3280"
 CAPTURE_HEIGHT  = "2464"
 CAPTURE_QUALITY = "95"
+# timelapse frames are re-encoded to video anyway; ~80 roughly halves bytes vs 95
+TL_QUALITY = os.environ.get("TL_QUALITY", "80")
 
 # timelapse-only capture size (4:3 to avoid cropping)
 TL_WIDTH  = "1640"         # or "1920"
@@ -393,6 +423,23 @@ HQ_HEIGHT = "2464"
 # encoding defaults / choices
 FPS_CHOICES = [10, 24, 30]
 DEFAULT_FPS = 24
+# libx264 CRF per preset; bitrate (kbit/s) is used by the hardware encoder instead
+ENCODE_PRESETS = {
+    "fast":     {"crf": "28", "bitrate": 3000},
+    "standard": {"crf": "23", "bitrate": 4000},
+    "quality":  {"crf": "20", "bitrate": 6000},
+}
+DEFAULT_PRESET = "standard"
+# Every session card repeats these <select>s, so build the options once, pre-escaped
+_OPTION_HTML = Markup('<option value="{0}"{1}>{2}</option>')
+FPS_OPTIONS_HTML = Markup("").join(
+    _OPTION_HTML.format(f, Markup(" selected") if f == DEFAULT_FPS else "", f) for f in FPS_CHOICES)
+PRESET_OPTIONS_HTML = Markup("").join(
+    _OPTION_HTML.format(p, Markup(" selected") if p == DEFAULT_PRESET else "", p.capitalize())
+    for p in ENCODE_PRESETS)
+# Sliced threads + no lookahead keeps every core busy without a deep frame queue;
+# override (e.g. "sliced-threads=0") to benchmark frame threading on a given Pi.
+X264_PARAMS = os.environ.get("X264_PARAMS", "sliced-threads=1:sync-lookahead=0:rc-lookahead=0")
 
 # thumbnails (off by default; we serve full frames on index)
 GENERATE_THUMBS = False
@@ -412,19 +459,30 @@ atexit.register(_cleanup_all)
 # camera orientation (degrees). Set to 0, 90, 180, or 270
 CAM_ROTATE_DEG = int(os.environ.get("CAM_ROTATE_DEG", "180"))
 
+_rot_flags_cache = (None, [])   # (lcd_prefs.json mtime_ns, flags)
+
 def _rot_flags_for(bin_path: str):
     """
     Return CLI flags to rotate frames for rpicam-* or libcamera-*.
     Uses --rotation <deg> (CW) and optional --hflip/--vflip from prefs.
     For 90/270 UI requests we fall back to software rotation.
     """
+    global _rot_flags_cache
+    # The flags only change when the LCD rewrites its prefs file, so skip re-reading it
+    try:
+        mtime = os.stat(PREFS_FILE).st_mtime_ns
+    except OSError:
+        mtime = -1
+    if _rot_flags_cache[0] == mtime:
+        return list(_rot_flags_cache[1])
     cam_deg = _cam_deg_for_backend()
     # Suppress 90/270 in hardware: not supported on your stack.
     if cam_deg in (90, 270):
         cam_deg = 0
     flags = (["--rotation", str(cam_deg)] if cam_deg in (180,) else [])
     flags += _mirror_flags_from_prefs()
-    return flags
+    _rot_flags_cache = (mtime, flags)
+    return list(flags)
 
 def _dims_for_rotation():
     """
@@ -439,6 +497,37 @@ def _dims_for_rotation():
 
 app = Flask(__name__)
 app.jinja_env.globals.update(datetime=datetime)
+# Behind nginx/Apache with X-Sendfile support, let the proxy stream files
+app.use_x_sendfile = os.environ.get("USE_X_SENDFILE", "0") == "1"
+# nginx "internal" location aliased to SESSIONS_DIR (e.g. /_sessions); empty = serve from Flask
+X_ACCEL_PREFIX = os.environ.get("X_ACCEL_PREFIX", "").rstrip("/")
+# Templates are inline constants, never edited at runtime
+app.jinja_env.auto_reload = False
+
+try:
+    import orjson  # optional; several JSON endpoints are polled every second
+except ImportError:
+    orjson = None
+
+def _dumps(obj):
+    """Serialize to JSON bytes with orjson when installed, compact stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def _j(obj):
+    """jsonify() for the hot polling endpoints."""
+    return app.response_class(_dumps(obj), mimetype="application/json")
+
+_compiled_tpls = {}  # id(template source constant) -> compiled jinja Template
+
+def _render(tpl, **ctx):
+    """Like render_template_string, but compiles each inline template only once."""
+    t = _compiled_tpls.get(id(tpl))
+    if t is None:
+        t = _compiled_tpls[id(tpl)] = app.jinja_env.from_string(tpl)
+    app.update_template_context(ctx)
+    return t.render(ctx)
 
 # Robust clear of shutdown flag at startup (in case import-time missed it)
 def _boot_clear_shutdown_flag():
@@ -460,26 +549,57 @@ except Exception:
     # Last resort: run now; import-time clear above should have handled it anyway.
     _boot_clear_shutdown_flag()
 
-# --- schedule_addon absolute-path import & init ---
-# try:
-#     import importlib.util
-#     _sched_path = "/home/pi/timelapse/schedule_addon.py"
-#     _spec = importlib.util.spec_from_file_location("schedule_addon", _sched_path)
-#     schedule_addon = importlib.util.module_from_spec(_spec)
-#     _spec.loader.exec_module(schedule_addon)
-#     # register blueprint(s)
-#     try:
-#         schedule_addon.init(app)
-#     except AttributeError:
-#         pass
-# except Exception as e:
-#     print("[schedule] init failed:", e)
-
 _last_frame_ts = 0
 _stop_event = threading.Event()
 _capture_thread = None
 _current_session = None   # session name (string) while capturing
-_jobs = {}                # encode job progress by session
+_active_state = {"name": None, "count": 0, "latest": "", "latest_ver": "", "quality": "std"}  # published by _capture_loop
+_jobs = OrderedDict()     # encode job progress by session ("zip:<sess>" for zips), oldest first
+_jobs_lock = threading.Lock()
+_jobs_json = None         # serialized /jobs body; None means stale
+JOB_EXPIRE_SEC = 60       # finished jobs are dropped from /jobs after this
+JOBS_MAX = 32             # cap on tracked jobs; oldest finished ones are evicted first
+
+# /events (server-sent events) streams sleep on this until jobs or the active capture change
+_events_cv = threading.Condition()
+_events_seq = 0
+_sse_clients = 0
+SSE_MAX_CLIENTS = int(os.environ.get("SSE_MAX_CLIENTS", "4"))  # each open stream holds a server thread
+SSE_KEEPALIVE_SEC = 5    # also how long a dead client keeps its thread before the write fails
+
+def _notify_events():
+    global _events_seq
+    with _events_cv:
+        _events_seq += 1
+        _events_cv.notify_all()
+
+def _set_job(key, job):
+    """Replace a job entry; entries are never mutated in place so snapshots stay consistent."""
+    global _jobs_json
+    if job.get("status") in ("done", "error"):
+        job["finished_ts"] = time.time()
+    with _jobs_lock:
+        _jobs[key] = job
+        _jobs.move_to_end(key)
+        if len(_jobs) > JOBS_MAX:
+            for k in [k for k, v in _jobs.items() if "finished_ts" in v][:len(_jobs) - JOBS_MAX]:
+                del _jobs[k]
+        _jobs_json = None
+    _notify_events()
+
+def _set_job_progress(key, progress):
+    global _jobs_json
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is None or job.get("progress") == progress:
+            return
+        _jobs[key] = dict(job, progress=progress)
+        _jobs_json = None
+    _notify_events()
+
+def _jobs_snapshot():
+    with _jobs_lock:
+        return dict(_jobs)
 
 _last_live_spawn = 0
 def _can_spawn_live(period=1.0):
@@ -495,6 +615,20 @@ import queue
 _encode_q = queue.Queue()
 _action_q = queue.Queue()
 
+def _hw_encoder_available():
+    """True if ffmpeg has h264_v4l2m2m. Probed once; the ffmpeg build can't change under us."""
+    if not hasattr(_hw_encoder_available, "_result"):
+        try:
+            p = subprocess.run([FFMPEG, "-hide_banner", "-encoders"],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True, timeout=2)
+            _hw_encoder_available._result = ("h264_v4l2m2m" in (p.stdout or ""))
+        except Exception:
+            return False  # don't cache a failed probe (e.g. timeout under load)
+    return _hw_encoder_available._result
+
+_FFMPEG_FRAME_RE = re.compile(rb"^frame=\s*(\d+)", re.M)
+
 def _start_encode_worker_once():
     if getattr(_start_encode_worker_once, "_started", False):
         return
@@ -506,8 +640,10 @@ def _start_encode_worker_once():
             if not task:
                 _encode_q.task_done()
                 continue
-            sess, fps = task
+            sess, fps, preset = (tuple(task) + (DEFAULT_PRESET,))[:3]
+            enc = ENCODE_PRESETS.get(preset, ENCODE_PRESETS[DEFAULT_PRESET])
             lcd_was_active = False
+            tmp_out = list_path = None
             try:
                 # If LCD service is active, instruct it to hide the splash and stop it
                 try:
@@ -537,90 +673,124 @@ def _start_encode_worker_once():
 
                 sess_dir = _session_path(sess)
                 out = _video_path(sess_dir)
+                # Encode beside the old video and swap it in only on success, so a
+                # crash never leaves a truncated video.mp4 behind.
+                tmp_out = out + ".tmp"
 
                 # Use std_frames if they exist, otherwise use the main session dir
                 std_frames_dir = os.path.join(sess_dir, "std_frames")
                 frames_source_dir = std_frames_dir if os.path.isdir(std_frames_dir) else sess_dir
                 
-                frames = sorted(glob.glob(os.path.join(frames_source_dir, "*.jpg")))
-                total_frames = len(frames)
+                # Empty files are frames that were never written; leave them out
+                with os.scandir(frames_source_dir) as it:
+                    names = sorted(e.name for e in it
+                                   if e.name.endswith(".jpg") and e.stat().st_size > 0)
+                total_frames = len(names)
                 if total_frames == 0:
-                    _jobs[sess] = {"status": "error", "progress": 0}
-                    _encode_q.task_done()
+                    _set_job(sess, {"status": "error", "progress": 0})
                     continue
 
-                _jobs[sess] = {"status": "encoding", "progress": 0}
-
-                # be tolerant if ionice/nice not installed
-                prio = []
-                if shutil.which("ionice"): prio += ["ionice", "-c3"]
-                if shutil.which("nice"):   prio += ["nice", "-n", "19"]
-
+                # Feed ffmpeg an explicit concat list: no glob expansion, gaps are harmless
+                list_path = out + ".frames.txt"
+                dur = f"duration {1.0 / fps:.6f}\n"
+                with open(list_path, "w") as f:
+                    f.write("ffconcat version 1.0\n")
+                    for name in names:
+                        f.write(f"file '{os.path.join(frames_source_dir, name)}'\n")
+                        f.write(dur)
+                    # concat demuxer quirk: repeat the last file so its duration is honoured
+                    f.write(f"file '{os.path.join(frames_source_dir, names[-1])}'\n")
+
+                _set_job(sess, {"status": "encoding", "progress": 0})
                 # Prefer hardware encoder when available (bcm2835-codec / h264_v4l2m2m)
-                hw_enc = "h264_v4l2m2m"
-                use_hw = False
+                use_hw = _hw_encoder_available()
+
+                # Only downscale when frames exceed the 1280px cap (std/hybrid frames already fit)
+                scale = ["-vf", "scale='min(iw,1280)':'min(ih,1280)':force_original_aspect_ratio=decrease:flags=fast_bilinear"]
+                vf = []
                 try:
-                    p = subprocess.run([FFMPEG, "-hide_banner", "-encoders"],
-                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                                       text=True, timeout=2)
-                    use_hw = (hw_enc in (p.stdout or ""))
+                    with Image.open(os.path.join(frames_source_dir, names[-1])) as im:
+                        if max(im.size) > 1280:
+                            vf = scale
                 except Exception:
-                    use_hw = False
+                    vf = scale
 
                 # Build ffmpeg command with conservative defaults; prefer hw encoder if present
                 common = [
                     FFMPEG, "-y",
+                    "-nostats", "-progress", "pipe:1", "-stats_period", "1",
                     "-threads", "1",
-                    "-framerate", str(fps),
-                    "-pattern_type", "glob",
-                    "-i", os.path.join(frames_source_dir, "*.jpg"),
+                    "-f", "concat", "-safe", "0",
+                    # deeper demux->encode queue so a slow SD read doesn't stall the encoder
+                    "-thread_queue_size", "512",
+                    "-i", list_path,
+                    "-r", str(fps),
                     "-pix_fmt", "yuv420p",
+                    # moov atom up front so downloads start playing immediately
+                    "-movflags", "+faststart",
+                    "-g", str(fps * 2), "-keyint_min", str(fps),
                 ]
 
                 if use_hw:
                     # Use the Pi's hardware encoder if available. Keep bitrate explicit so quality is sane.
-                    cmd = prio + common + [
-                        "-vf", "scale='min(iw,1280)':'min(ih,1280)':force_original_aspect_ratio=decrease",
+                    cmd = LOW_PRIO + common + vf + [
                         "-c:v", "h264_v4l2m2m",
-                        "-b:v", "4000k",
-                        "-maxrate", "4000k",
-                        "-bufsize", "8000k",
-                        out
+                        "-b:v", f"{enc['bitrate']}k",
+                        "-maxrate", f"{enc['bitrate']}k",
+                        "-bufsize", f"{enc['bitrate'] * 2}k",
+                        "-f", "mp4", tmp_out
                     ]
                 else:
                     # Software fallback (libx264) — keeps good quality but is CPU intensive
-                    cmd = prio + common + [
-                        "-vf", "scale='min(iw,1280)':'min(ih,1280)':force_original_aspect_ratio=decrease",
+                    cmd = LOW_PRIO + common + vf + [
                         "-c:v", "libx264",
                         "-preset", "veryfast",
-                        "-crf", "23",
-                        out
+                        "-tune", "zerolatency",
+                        "-threads", str(os.cpu_count() or 4),
+                        "-x264-params", X264_PARAMS,
+                        "-crf", enc["crf"],
+                        "-maxrate", "6M", "-bufsize", "12M",
+                        "-f", "mp4", tmp_out
                     ]
 
                 proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                        stderr=subprocess.STDOUT, text=True)
-                # Parse frame progress lines from ffmpeg's stdout if available
+                                        stderr=subprocess.DEVNULL)
+                # -progress emits key=value blocks at a fixed cadence; only the newest
+                # frame= in each read matters, so match per chunk rather than per line.
+                last_update = 0.0
+                tail = b""
                 while True:
-                    line = proc.stdout.readline()
-                    if not line and proc.poll() is not None:
+                    chunk = proc.stdout.read1(8192)
+                    if not chunk:
+                        break
+                    data = tail + chunk
+                    cut = data.rfind(b"\n") + 1
+                    data, tail = data[:cut], data[cut:]
+                    frames_done = _FFMPEG_FRAME_RE.findall(data)
+                    now = time.monotonic()
+                    if frames_done and now - last_update >= 0.1:
+                        last_update = now
+                        prog = int(int(frames_done[-1]) * 100 / max(1, total_frames))
+                        _set_job_progress(sess, max(0, min(99, prog)))
+                    if b"progress=end" in data:
                         break
-                    if "frame=" in line:
-                        try:
-                            parts = line.split("frame=")[-1].strip().split()
-                            frame_num = int(parts[0])
-                            prog = int((frame_num / max(1, total_frames)) * 99)
-                            _jobs[sess]["progress"] = max(0, min(99, prog))
-                        except Exception:
-                            pass
 
                 rc = proc.wait()
-                if rc == 0 and os.path.exists(out):
-                    _jobs[sess] = {"status": "done", "progress": 100}
+                if rc == 0 and os.path.exists(tmp_out):
+                    os.replace(tmp_out, out)
+                    _set_job(sess, {"status": "done", "progress": 100})
                 else:
-                    _jobs[sess] = {"status": "error", "progress": 0}
+                    _set_job(sess, {"status": "error", "progress": 0})
             except Exception:
-                _jobs[sess] = {"status": "error", "progress": 0}
+                _set_job(sess, {"status": "error", "progress": 0})
             finally:
+                for leftover in (tmp_out, list_path):
+                    try:
+                        if leftover and os.path.exists(leftover):
+                            os.remove(leftover)
+                    except Exception:
+                        pass
+                _invalidate_sessions_cache()
                 try:
                     # If we previously stopped the LCD service, restart it and remove the hide flag
                     if lcd_was_active:
@@ -669,11 +839,11 @@ def _start_zip_worker_once():
                 files = sorted([f for f in os.listdir(sess_dir) if f.lower().endswith('.jpg')])
                 total = len(files)
                 if total == 0:
-                    _jobs[job_key] = {"status":"error","progress":0,"reason":"no_images"}
+                    _set_job(job_key, {"status":"error","progress":0,"reason":"no_images"})
                     _zip_q.task_done()
                     continue
 
-                _jobs[job_key] = {"status":"zipping","progress":0,"path":zip_path}
+                _set_job(job_key, {"status":"zipping","progress":0,"path":zip_path})
                 tmp = zip_path + ".tmp"
 
                 # THE FIX: Change compression from ZIP_DEFLATED to ZIP_STORED
@@ -686,11 +856,7 @@ def _start_zip_worker_once():
                             # log but continue (capture processes may be writing)
                             print(f"[zip_worker] failed to add {file_path}: {e}")
                         # Update progress (0..100)
-                        try:
-                            _jobs[job_key]["progress"] = int((idx / total) * 100)
-                        except Exception:
-                            _jobs[job_key] = {"status":"zipping","progress":int((idx / total) * 100),"path":zip_path}
-
+                        _set_job_progress(job_key, int((idx / total) * 100))
                 # Atomically move into place
                 try:
                     os.replace(tmp, zip_path)
@@ -698,10 +864,10 @@ def _start_zip_worker_once():
                     # final move failed; fall back to rename
                     os.rename(tmp, zip_path)
 
-                _jobs[job_key] = {"status":"done","progress":100,"path":zip_path}
-
+                _invalidate_disk_cache()
+                _set_job(job_key, {"status":"done","progress":100,"path":zip_path})
             except Exception as e:
-                _jobs[job_key] = {"status":"error","progress":0,"reason":str(e)}
+                _set_job(job_key, {"status":"error","progress":0,"reason":str(e)})
             finally:
                 _zip_q.task_done()
 
@@ -717,7 +883,7 @@ def _warmup_camera():
     global _camera_warmed
     if _camera_warmed:
         return
-    vid_bin = shutil.which("rpicam-vid") or shutil.which("libcamera-vid")
+    vid_bin = CAMERA_VID
     if not vid_bin:
         return
     try:
@@ -731,8 +897,7 @@ def _warmup_camera():
         # harmless if it fails; we’ll fall back to retry below
         pass
 
-# Globals for timed captures
-_capture_stop_timer = None
+# Globals for timed captures (the scheduler thread stops a capture at _capture_end_ts)
 _capture_end_ts     = None
 _capture_start_ts   = None 
 _active_schedule_id = None
@@ -764,22 +929,24 @@ def toggle_lcd_power():
 @app.get("/session_status/<sess>")
 def session_status(sess):
     """Return JSON with number of frames and remaining seconds for a session."""
+    return _j(_session_status(sess))
+
+def _session_status(sess):
     active = (_current_session == sess)
     frames_count = 0
     quality = 'std'  # Default quality
+    st = _active_state
     try:
         sess_dir = _session_path(sess)
-        if os.path.isdir(sess_dir):
-            frames_count = len(glob.glob(os.path.join(sess_dir, "*.jpg")))
-            # THE FIX: Read the quality setting for the active session
-            quality_file = os.path.join(sess_dir, 'quality.json')
-            if os.path.exists(quality_file):
-                try:
-                    with open(quality_file, 'r') as f:
-                        data = json.load(f)
-                        quality = data.get('quality', 'std')
-                except Exception:
-                    pass
+        if active and st["name"] == sess:
+            # The capture thread publishes its count; polling the active card touches no disk
+            frames_count = st["count"]
+            quality = st["quality"]
+        elif os.path.isdir(sess_dir):
+            # Cached on the directory mtime: count + quality from one scandir pass
+            scan = _scan_session(sess_dir)
+            frames_count = scan["count"]
+            quality = scan["quality"]
     except Exception:
         frames_count = 0
 
@@ -792,7 +959,7 @@ def session_status(sess):
     except Exception:
         remaining_sec = None
         
-    return jsonify({
+    return {
         "active": active,
         "frames": frames_count,
         "remaining_sec": remaining_sec,
@@ -800,40 +967,50 @@ def session_status(sess):
         "end_ts": (_capture_end_ts if active else None),
         "interval": (_capture_interval if active else None),
         "fps": (_capture_fps if active else None),
-        "quality": quality # Add quality to the response
-    })
+        "quality": quality, # Add quality to the response
+        "latest": (st["latest"] if active and st["name"] == sess else None),
+        "latest_ver": (st["latest_ver"] if active and st["name"] == sess else None),
+    }
 
 # ---------- Helpers ----------
 def _session_path(name): return os.path.join(SESSIONS_DIR, name)
-def _session_latest_jpg(sess_dir):
-    files = sorted(glob.glob(os.path.join(sess_dir, "*.jpg")))
-    return files[-1] if files else None
+
+def _frame_ver(path):
+    """Preview version token: frame name + mtime, so a reused session name can't hit a stale cache."""
+    try:
+        return f"{os.path.basename(path)}-{os.stat(path).st_mtime_ns}"
+    except OSError:
+        return ""
 def _video_path(sess_dir): return os.path.join(sess_dir, "video.mp4")
-def _safe_name(s): return "".join(c for c in s if c.isalnum() or c in ("-","_"))
+
+def _x_accel_response(path):
+    """Empty response telling nginx to send `path` (under SESSIONS_DIR) itself via sendfile."""
+    rel = os.path.relpath(path, SESSIONS_DIR).replace(os.sep, "/")
+    resp = app.response_class(mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream")
+    resp.headers["X-Accel-Redirect"] = f"{X_ACCEL_PREFIX}/{quote(rel)}"
+    return resp
+
+def _send_session_file(path, download_name):
+    """Send a file under SESSIONS_DIR as an attachment, handing it to nginx when X_ACCEL_PREFIX is set."""
+    if X_ACCEL_PREFIX:
+        resp = _x_accel_response(path)
+        resp.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(download_name)}"
+        return resp
+    # conditional=True adds Range/304 support; the WSGI server's file_wrapper can sendfile() it
+    return send_file(path, as_attachment=True, download_name=download_name, conditional=True)
+_SAFE_NAME_RE = re.compile(r"[^\w-]+")  # \w keeps the same (unicode) alnum + "_" set as before
+def _safe_name(s): return _SAFE_NAME_RE.sub("", s)
 def _timestamped_session():
     return "session-" + datetime.now().strftime("%Y%m%d-%H%M%S")
 
 def _any_encoding_active():
-    return any(v.get("status") in ("queued", "encoding") for v in _jobs.values())
-
-def _cancel_schedule_locked(sid: str):
-    """Assumes _sched_lock is held."""
-    timers = _sched_timers.pop(sid, {})
-    for t in timers.values():
-        try:
-            t and t.cancel()
-        except Exception:
-            pass
-    _schedules.pop(sid, None)
-    try:
-        _save_sched_state()
-    except Exception:
-        pass
+    return any(v.get("status") in ("queued", "encoding") for v in _jobs_snapshot().values())
 
 # ---- Live viewfinder ----
 LIVE_PROC = None
 LIVE_LOCK = threading.Lock()
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 _live_last_stderr = deque(maxlen=120)
 
 def _trace(msg: str):
@@ -842,11 +1019,136 @@ def _trace(msg: str):
     except Exception:
         pass
 
+_JPEG_SOI = b'\xff\xd8'
+_JPEG_EOI = b'\xff\xd9'
+
+def _iter_lines(stream, chunk_size=4096):
+    """Yield lines (without the newline) from a binary pipe, one read1() per chunk."""
+    buf = b""
+    while True:
+        chunk = stream.read1(chunk_size)
+        if not chunk:
+            if buf:
+                yield buf
+            return
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        yield from lines
+
+def _iter_mjpeg_frames(stream, chunk_size=65536, buf_size=1 << 21):
+    """
+    Yield complete JPEG frames (SOI..EOI) from an MJPEG byte stream until EOF.
+    Bytes after a frame's EOI are kept for the next frame instead of being dropped.
+    """
+    # Reads land directly in one fixed buffer; consumed bytes are skipped by index
+    # and the unconsumed tail is moved to the front only when the buffer fills up.
+    readinto = getattr(stream, "readinto1", None) or stream.readinto
+    buf = bytearray(buf_size)
+    view = memoryview(buf)
+    start = end = 0   # unconsumed bytes are buf[start:end]
+    scan = 0          # where to resume the EOI search, so each byte is scanned once
+    while True:
+        if end + chunk_size > len(buf):
+            if start:
+                view[:end - start] = view[start:end]   # overlapping move
+                end -= start
+                scan = max(0, scan - start)
+                start = 0
+            if end + chunk_size > len(buf):
+                # one frame outgrew the buffer; it can't be resized while viewed
+                view.release()
+                buf.extend(bytes(len(buf)))
+                view = memoryview(buf)
+        n = readinto(view[end:end + chunk_size])
+        if not n:
+            return
+        end += n
+        while True:
+            soi = buf.find(_JPEG_SOI, start, end)
+            if soi < 0:
+                start = max(start, end - 1)  # keep a trailing 0xFF that may begin the next SOI
+                scan = start
+                break
+            start = soi
+            eoi = buf.find(_JPEG_EOI, max(soi + 2, scan), end)
+            if eoi < 0:
+                scan = max(soi + 2, end - 1)
+                break
+            yield bytes(view[soi:eoi + 2])
+            start = scan = eoi + 2
+        if start == end:
+            start = end = scan = 0
+
+class CameraBroadcaster:
+    """
+    Reads frames from the shared live process exactly once and keeps only the
+    newest one. Each /live.mjpg client waits for a frame newer than the last
+    one it sent, so a slow client skips straight to the latest frame instead
+    of working through a backlog.
+    """
+    def __init__(self):
+        self._cv = threading.Condition()
+        self._proc = None
+        self._frame = None   # newest JPEG; None after the stream ended
+        self._seq = 0        # bumped for every frame and for end-of-stream
+
+    def start(self, proc):
+        with self._cv:
+            self._proc = proc
+            self._frame = None
+        threading.Thread(target=self._run, args=(proc,), daemon=True).start()
+
+    def stop(self):
+        with self._cv:
+            self._proc = None
+            self._end()
+
+    def _end(self):
+        # caller holds self._cv
+        self._frame = None
+        self._seq += 1
+        self._cv.notify_all()
+
+    def subscribe(self):
+        """Return a cursor for wait_frame(); the current frame counts as unseen."""
+        with self._cv:
+            return self._seq - 1 if self._frame is not None else self._seq
+
+    def wait_frame(self, seen, timeout):
+        """Return (cursor, newest frame) once there is one newer than `seen`; None frame on end/timeout."""
+        with self._cv:
+            if not self._cv.wait_for(lambda: self._seq != seen, timeout):
+                return seen, None
+            return self._seq, self._frame
+
+    def _run(self, proc):
+        try:
+            for frame in _iter_mjpeg_frames(proc.stdout):
+                with self._cv:
+                    if self._proc is not proc:
+                        return
+                    self._frame = frame
+                    self._seq += 1
+                    self._cv.notify_all()
+        except Exception as e:
+            _trace(f"broadcaster error: {e}")
+        finally:
+            with self._cv:
+                if self._proc is proc:
+                    self._end()
+
+_live_bcast = CameraBroadcaster()
+
+# The CRLF that ends a part belongs to the next delimiter, so each frame needs
+# just one pre-built header chunk in front of it (bytes: WSGI servers reject memoryview).
+_MJPEG_PART_HDR = b"\r\n--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n"
+
 def _force_release_camera():
     """
     Best-effort: kill any leftover processes that hold the camera.
     Safe to call right before spawning live preview.
     """
+    _invalidate_live_diag()
     names = ["rpicam-vid", "libcamera-vid", "rpicam-still", "libcamera-still"]
     for nm in names:
         try:
@@ -860,48 +1162,139 @@ def _force_release_camera():
 def _idle_now():
     return (_capture_thread is None or not _capture_thread.is_alive()) and not _any_encoding_active()
 
+# Session listing cache: the whole list is reused while SESSIONS_DIR's mtime
+# is unchanged (for at most _SESSIONS_TTL seconds), and each session's scan is
+# reused while that session directory's mtime is unchanged.
+_SESSIONS_TTL = 2.0
+_sessions_lock = threading.Lock()
+_sessions_cache = {"ts": 0.0, "mtime": 0, "data": []}
+_sess_scan_cache = {}     # session dir -> (mtime_ns, summary)
+
+def _invalidate_sessions_cache():
+    with _sessions_lock:
+        _sessions_cache["ts"] = 0.0
+    _invalidate_disk_cache()   # sessions were added, removed or encoded
+
+def _scan_session(sd, mtime_ns=None):
+    """Count frames, find the newest one and spot video/zip/quality files in one readdir pass."""
+    if mtime_ns is None:
+        mtime_ns = os.stat(sd).st_mtime_ns
+    hit = _sess_scan_cache.get(sd)
+    if hit and hit[0] == mtime_ns:
+        return hit[1]
+
+    # Frame names are monotonic %06d.jpg, so the max name is the newest frame.
+    count, latest, has_video = 0, "", False
+    zips, has_quality = set(), False
+    with os.scandir(sd) as it:
+        for f in it:
+            name = f.name
+            if name.endswith(".jpg"):
+                count += 1
+                if name > latest:
+                    latest = name
+            elif name == "video.mp4":
+                has_video = True
+            elif name.endswith("-images.zip"):
+                zips.add(name)
+            elif name == "quality.json":
+                has_quality = True
+
+    quality = 'std' # Default to standard
+    if has_quality:
+        try:
+            with open(os.path.join(sd, 'quality.json'), 'r') as f:
+                quality = json.load(f).get('quality', 'std')
+        except Exception:
+            pass # Keep default if file is corrupted
+
+    summary = {"count": count, "latest": latest, "has_video": has_video,
+               "latest_ver": _frame_ver(os.path.join(sd, latest)) if latest else "",
+               "zips": zips, "quality": quality}
+    _sess_scan_cache[sd] = (mtime_ns, summary)
+    return summary
+
+_LS_EXEC = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ls")
+# Blocking helpers (vcgencmd probes, thumbnails) run here instead of serially in a request
+_BG_EXEC = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bg")
+
+def _bg_result(fut, default, timeout=2.0):
+    """fut.result(), but a slow or failing probe degrades to `default` instead of stalling the page."""
+    try:
+        return fut.result(timeout=timeout)
+    except Exception:
+        return default
+
+def _summarize_session(entry):
+    """Build one _list_sessions row from a (name, path, stat) tuple; None if it vanished."""
+    d, sd, st = entry
+    try:
+        scan = _scan_session(sd, st.st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    return {
+        "name": d,
+        "dir": sd,
+        "has_frame": bool(scan["latest"]),
+        "latest": scan["latest"],
+        "latest_ver": scan["latest_ver"],
+        "has_video": scan["has_video"],
+        "has_zip": f"{_safe_name(d)}-images.zip" in scan["zips"],
+        "video": "video.mp4" if scan["has_video"] else "",
+        "count": scan["count"],
+        "created_ts": st.st_ctime,
+        "quality": scan["quality"],
+    }
+
 def _list_sessions():
-    out = []
-    # Use try-except to handle cases where SESSIONS_DIR might not exist yet
     try:
-        for d in os.listdir(SESSIONS_DIR):
-            sd = os.path.join(SESSIONS_DIR, d)
-            if not os.path.isdir(sd): continue
-            
-            jpg = _session_latest_jpg(sd)
-            vid = _video_path(sd)
-            zip_path = os.path.join(sd, f"{_safe_name(d)}-images.zip")
-            has_video = os.path.exists(vid)
-            has_zip = os.path.exists(zip_path)
-
-            quality = 'std' # Default to standard
-            quality_file = os.path.join(sd, 'quality.json')
-            if os.path.exists(quality_file):
-                try:
-                    with open(quality_file, 'r') as f:
-                        data = json.load(f)
-                        quality = data.get('quality', 'std')
-                except Exception:
-                    pass # Keep default if file is corrupted
-            
-            out.append({
-                "name": d,
-                "dir": sd,
-                "has_frame": bool(jpg),
-                "latest": os.path.basename(jpg) if jpg else "",
-                "has_video": has_video,
-                "has_zip": has_zip,
-                "video": os.path.basename(vid) if has_video else "",
-                "count": len(glob.glob(os.path.join(sd, "*.jpg"))),
-                "created_ts": os.path.getctime(sd),
-                "quality": quality,
-            })
+        top_mtime = os.stat(SESSIONS_DIR).st_mtime_ns
     except FileNotFoundError:
-        pass # Return an empty list if the directory doesn't exist
-        
+        return [] # Return an empty list if the directory doesn't exist
+
+    now = time.monotonic()
+    with _sessions_lock:
+        c = _sessions_cache
+        if c["mtime"] == top_mtime and now - c["ts"] < _SESSIONS_TTL:
+            return _apply_active_state(c["data"])
+
+    entries = []
+    # Use try-except to handle cases where SESSIONS_DIR might vanish meanwhile
+    try:
+        with os.scandir(SESSIONS_DIR) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    entries.append((e.name, e.path, e.stat(follow_symlinks=False)))
+    except FileNotFoundError:
+        pass
+    seen = {sd for _, sd, _ in entries}
+
+    # Uncached session scans are SD-card latency bound, so overlap them
+    if len(entries) > 1:
+        out = list(_LS_EXEC.map(_summarize_session, entries))
+    else:
+        out = [_summarize_session(x) for x in entries]
+    out = [s for s in out if s]
+
+    # Drop scans of sessions that were renamed or deleted
+    # list() snapshots the keys in one C call; other threads add scans concurrently
+    for sd in [k for k in list(_sess_scan_cache) if k not in seen]:
+        _sess_scan_cache.pop(sd, None)
+
     # Sort the list of sessions by the creation timestamp, newest first
     out.sort(key=lambda x: x["created_ts"], reverse=True)
-    return out
+    with _sessions_lock:
+        _sessions_cache.update(ts=now, mtime=top_mtime, data=out)
+    return _apply_active_state(out)
+
+def _apply_active_state(sessions):
+    """Return a copy of `sessions` with the capture thread's live count/latest for the active one."""
+    st = _active_state
+    if not _current_session or st["name"] != _current_session or not st["count"]:
+        return list(sessions)
+    return [dict(s, count=st["count"], latest=st["latest"], latest_ver=st["latest_ver"],
+                 has_frame=True) if s["name"] == st["name"] else s
+            for s in sessions]
 
 # ===== Simplified Scheduler =====
 import uuid
@@ -909,16 +1302,49 @@ import uuid
 _schedules = {}      # id -> dict (state)
 SCHED_FILE = os.path.join(BASE, "schedule.json")
 _sched_lock = threading.Lock()
+_sched_cv = threading.Condition(_sched_lock)  # notified when schedules change
+SCHED_MAX_SLEEP = 60    # re-check at least this often (wall clock may be set via /set_time)
+SCHED_PENDING_POLL = 5  # while a start/stop is due but not yet applied
+
+_sched_save_lock = threading.Lock()   # orders file writes; taken before _sched_lock, never inside it
+_sched_persisted = None               # JSON text last written to SCHED_FILE
 
 def _save_sched_state():
-    try:
-        tmp = SCHED_FILE + ".tmp"
-        with open(tmp, "w") as f:
-            json.dump(_schedules, f)
-            f.flush(); os.fsync(f.fileno())
-        os.replace(tmp, SCHED_FILE)
-    except Exception:
-        pass
+    """Persist _schedules atomically. Call after releasing _sched_lock; no-op if unchanged."""
+    global _sched_persisted
+    with _sched_save_lock:
+        # Snapshot under the save lock so a slower writer can't replace newer state
+        with _sched_lock:
+            data = json.dumps(_schedules)
+        if data == _sched_persisted:
+            return
+        try:
+            tmp = SCHED_FILE + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(data)
+                f.flush(); os.fsync(f.fileno())
+            os.replace(tmp, SCHED_FILE)
+            _sched_persisted = data
+        except Exception:
+            pass
+
+# Mutations only mark the state dirty; one flusher thread writes it shortly after,
+# so a burst of arm/cancel/stop requests costs a single fsync.
+SCHED_FLUSH_DELAY = 0.25
+_sched_dirty = threading.Event()
+
+def _mark_sched_dirty():
+    _sched_dirty.set()
+
+def _sched_flusher_thread():
+    while True:
+        _sched_dirty.wait()
+        time.sleep(SCHED_FLUSH_DELAY)
+        _sched_dirty.clear()   # changes after this point trigger another pass
+        _save_sched_state()
+
+threading.Thread(target=_sched_flusher_thread, daemon=True).start()
+atexit.register(_save_sched_state)   # don't lose a change still waiting for the flusher
 
 def _load_sched_state():
     try:
@@ -932,13 +1358,41 @@ def _load_sched_state():
         pass
     return False
 
+def _sched_snapshot():
+    """(id, private copy) for every schedule, taken in one short _sched_lock hold."""
+    with _sched_lock:
+        return [(sid, dict(st)) for sid, st in _schedules.items()]
+
+def _sched_next_wait(now):
+    """Seconds until the next schedule boundary. Assumes _sched_lock is held."""
+    due = now + SCHED_MAX_SLEEP
+    running = _active_schedule_id if _current_session else None
+    if _current_session and not running and _capture_end_ts:
+        # Timed manual capture: same end/nudge rule as a scheduled one
+        due = min(due, _capture_end_ts if now < _capture_end_ts else now + SCHED_PENDING_POLL)
+    for sid, sd in _schedules.items():
+        start, end = sd.get("start_ts", 0), sd.get("end_ts", 0)
+        if sid == running:
+            # Our capture: wake at its end, then keep nudging until the stop lands
+            due = min(due, end if now < end else now + SCHED_PENDING_POLL)
+        elif sd.get('manually_stopped'):
+            continue
+        elif now < start:
+            due = min(due, start)
+        elif now < end:
+            due = min(due, now + SCHED_PENDING_POLL)  # should be running; waiting to be idle
+    return max(0.5, due - now)
+
 def _scheduler_thread():
-    """A single thread that wakes up periodically to manage all schedules."""
+    """A single thread that sleeps until the next schedule boundary (or a change) and acts."""
     time.sleep(10)
 
     while True:
-        try:
-            with _sched_lock:
+        # Decide and go to sleep in one lock hold: a notify() sent after we looked
+        # at the schedules but before wait() would otherwise be lost.
+        with _sched_cv:
+            wait = SCHED_PENDING_POLL
+            try:
                 now = time.time()
                 
                 # --- Stop Logic (now using the tracking variable) ---
@@ -947,6 +1401,10 @@ def _scheduler_thread():
                     if active_schedule and active_schedule.get("end_ts", 0) <= now:
                         print(f"[scheduler] Active schedule '{_active_schedule_id}' has ended. Queueing STOP action.")
                         _action_q.put(('stop', {})) # Just send a simple stop command
+                elif _current_session and _capture_end_ts:
+                    if _capture_end_ts <= now:
+                        print("[scheduler] Timed capture has ended. Queueing STOP action.")
+                        _action_q.put(('stop', {}))
 
                 # --- Start Logic ---
                 elif _idle_now():
@@ -965,11 +1423,11 @@ def _scheduler_thread():
                     if schedule_to_start:
                         print(f"[scheduler] Schedule '{schedule_to_start['id']}' is active. Queueing START action.")
                         _action_q.put(('start', {'schedule': schedule_to_start}))
-        
-        except Exception as e:
-            print(f"[scheduler] Error in scheduler thread: {e}")
 
-        time.sleep(5)
+                wait = _sched_next_wait(now)
+            except Exception as e:
+                print(f"[scheduler] Error in scheduler thread: {e}")
+            _sched_cv.wait(timeout=wait)
 
 # Start the single scheduler thread once
 threading.Thread(target=_scheduler_thread, daemon=True).start()
@@ -980,7 +1438,7 @@ def _action_processor_thread():
     It reads commands from _action_q to ensure all actions are serialized and safe.
     """
     # All global variables that are assigned to in this function MUST be declared at the top.
-    global _active_schedule_id, _capture_end_ts, _capture_stop_timer
+    global _active_schedule_id, _capture_end_ts
     global _current_session, _capture_thread, _capture_start_ts
     # --- END OF FIX ---
 
@@ -996,13 +1454,14 @@ def _action_processor_thread():
             _stop_live_proc()
 
             quality = payload.get('quality', 'std')
+            end_ts = None
             
             if 'schedule' in payload:
                 sched = _schedules.get(payload['schedule']['id'], {})
                 interval = sched.get('interval', 10)
                 sess_name = sched.get('sess', '')
                 _active_schedule_id = payload['schedule']['id']
-                _capture_end_ts = sched.get('end_ts')
+                end_ts = sched.get('end_ts')
                 # UI: capture metadata
                 globals()['_capture_interval'] = interval
                 globals()['_capture_fps'] = sched.get('fps', DEFAULT_FPS)
@@ -1015,16 +1474,14 @@ def _action_processor_thread():
                 globals()['_capture_interval'] = interval
                 globals()['_capture_fps'] = DEFAULT_FPS
                 if 'duration_min' in payload:
-                    _capture_end_ts = time.time() + payload['duration_min'] * 60
-                    _capture_stop_timer = threading.Timer(payload['duration_min'] * 60, stop_timelapse)
-                    _capture_stop_timer.daemon = True
-                    _capture_stop_timer.start()
+                    end_ts = time.time() + payload['duration_min'] * 60
 
             _current_session = _safe_name(sess_name or _timestamped_session())
             _stop_event.clear()
             _capture_start_ts = time.time()
             sess_dir = _session_path(_current_session)
             os.makedirs(sess_dir, exist_ok=True)
+            _invalidate_sessions_cache()
 
             # Create a subdirectory for standard-def frames if in hybrid mode
             if quality == 'hybrid':
@@ -1036,8 +1493,16 @@ def _action_processor_thread():
             except Exception as e:
                 print(f"[processor] Error saving quality file: {e}")
 
-            _capture_thread = threading.Thread(target=_capture_loop, args=(sess_dir, interval, quality), daemon=True)
+            _capture_thread = threading.Thread(target=_capture_loop,
+                                               args=(sess_dir, interval, quality, payload.get('jpeg_quality')),
+                                               daemon=True)
             _capture_thread.start()
+            # Publish the end time under the scheduler's lock so it is either still
+            # deciding (and sees it) or already waiting (and gets the notify)
+            with _sched_cv:
+                _capture_end_ts = end_ts
+                if end_ts:
+                    _sched_cv.notify()   # re-plan the scheduler's sleep around the new end time
             
         elif action == 'stop':
             session_to_stop = _current_session
@@ -1060,32 +1525,113 @@ threading.Thread(target=_action_processor_thread, daemon=True).start()
 
 
 # ---------- Capture thread ----------
-def _capture_loop(sess_dir, interval, quality='std'):
-    global _stop_event, _last_frame_ts
+def _capture_loop(sess_dir, interval, quality='std', jpeg_quality=None):
+    global _active_state
 
-    raw_dir = os.path.join(sess_dir, "_raw")
-    os.makedirs(raw_dir, exist_ok=True)
+    keep_dir = os.path.join(sess_dir, "_raw")   # unprocessed frames that must survive
+    raw_dir = os.path.join(RAW_TMPFS, os.path.basename(sess_dir))
+    try:
+        os.makedirs(raw_dir, exist_ok=True)
+    except OSError:
+        raw_dir = keep_dir   # no tmpfs: fall back to the session dir
+        os.makedirs(raw_dir, exist_ok=True)
     jpg_pattern = os.path.join(raw_dir, "%06d.jpg")
     
     total_run_time_ms = 24 * 3600 * 1000 # 24 hours in ms
 
     # Choose resolution: HQ for 'hq' and 'hybrid', otherwise STD
     width, height = (HQ_WIDTH, HQ_HEIGHT) if quality in ('hq', 'hybrid') else (TL_WIDTH, TL_HEIGHT)
+    # JPEG quality of the stored frames (the raw capture uses the same, so they aren't
+    # degraded twice); HQ keeps the still-photo quality unless the user chose one
+    jpeg_q = int(jpeg_quality or (CAPTURE_QUALITY if quality in ('hq', 'hybrid') else TL_QUALITY))
+
+    # Publish frame count / newest frame so pollers don't rescan the directory
+    try:
+        scan = _scan_session(sess_dir)
+        count, latest, latest_ver = scan["count"], scan["latest"], scan["latest_ver"]
+    except OSError:
+        count, latest, latest_ver = 0, "", ""
+    _active_state = {"name": os.path.basename(sess_dir), "count": count, "latest": latest,
+                     "latest_ver": latest_ver, "quality": quality}
+    _notify_events()
+
+    # A resumed session must continue numbering after its newest frame (processed
+    # or still raw), otherwise rpicam starts at 0 and overwrites existing frames.
+    newest = latest
+    for d in {raw_dir, keep_dir}:
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.name.endswith(".jpg") and e.name > newest:
+                        newest = e.name
+        except FileNotFoundError:
+            pass
+    try:
+        frame_start = int(newest[:-4]) + 1 if newest else 0
+    except ValueError:
+        frame_start = 0
 
     cmd = [
         CAMERA_STILL,
         "-o", jpg_pattern,
         "--width", width, "--height", height,
-        "--quality", CAPTURE_QUALITY,
+        "--quality", str(jpeg_q),
+        "--denoise", "cdn_off",  # colour denoise costs capture time; frames are re-encoded anyway
         "--nopreview",
         "--exposure", "normal",
         "--metering", "centre",
         "--timelapse", str(int(interval * 1000)),
+        "--framestart", str(frame_start),
         "-t", str(total_run_time_ms)
     ]
 
     proc = None
     log_path = os.path.join(sess_dir, "capture.log")
+    done_upto = ""   # high-water mark: raw names are zero-padded and monotonic
+    first = True
+
+    def _keep_raw(src):
+        """Park an unprocessed raw frame in <session>/_raw so tmpfs can't lose it."""
+        if raw_dir == keep_dir:
+            return
+        try:
+            os.makedirs(keep_dir, exist_ok=True)
+            shutil.move(src, os.path.join(keep_dir, os.path.basename(src)))
+        except OSError as e:
+            print(f"[capture] could not keep raw frame {src}: {e}")
+
+    def _drain(final=False):
+        """Rotate every new raw frame into the session dir, then drop the raw copy."""
+        nonlocal done_upto, first, count
+        global _active_state
+        with os.scandir(raw_dir) as it:
+            pending = sorted(e.name for e in it
+                             if e.name.endswith(".jpg") and e.name > done_upto)
+        for idx, base in enumerate(pending):
+            src = os.path.join(raw_dir, base)
+            dst = os.path.join(sess_dir, base)
+            if not _rotate_copy_to(src, dst, quality=jpeg_q):
+                if idx == len(pending) - 1 and not final:
+                    break   # newest frame may still be being written; retry next tick
+                done_upto = base   # a newer frame exists, so this one is truly bad
+                _keep_raw(src)     # but keep it (unrotated) and free the RAM it holds
+                continue
+            done_upto = base
+            try:
+                os.remove(src)
+            except OSError:
+                pass
+            count += 1
+            _active_state = dict(_active_state, count=count, latest=base, latest_ver=_frame_ver(dst))
+            _notify_events()
+            if first:
+                _invalidate_sessions_cache()
+                first = False
+
+            # If in hybrid mode, create the downscaled copy
+            if quality == 'hybrid':
+                std_dst = os.path.join(sess_dir, 'std_frames', base)
+                _downscale_copy_to(dst, std_dst)
 
     try:
         with open(log_path, "w") as log_file:
@@ -1094,23 +1640,12 @@ def _capture_loop(sess_dir, interval, quality='std'):
             log_file.flush()
 
             proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=log_file)
-            processed = set()
+            # Frames only arrive every `interval` seconds; don't wake 4x/s for long intervals
+            poll = min(1.0, max(0.25, interval / 10.0))
 
-            while not _stop_event.wait(timeout=0.25):
+            while not _stop_event.wait(timeout=poll):
                 try:
-                    for src in sorted(glob.glob(os.path.join(raw_dir, "*.jpg"))):
-                        if src in processed:
-                            continue
-                        base = os.path.basename(src)
-                        dst  = os.path.join(sess_dir, base)
-                        _rotate_copy_to(src, dst)
-                        processed.add(src)
-                        
-                        # If in hybrid mode, create the downscaled copy
-                        if quality == 'hybrid' and os.path.exists(dst):
-                            std_dst = os.path.join(sess_dir, 'std_frames', base)
-                            _downscale_copy_to(dst, std_dst)
-
+                    _drain()
                 except Exception as _e:
                     log_file.write(f"Rotation/downscale error: {_e}\n")
 
@@ -1132,6 +1667,21 @@ def _capture_loop(sess_dir, interval, quality='std'):
             except Exception:
                 pass
 
+        # Frames written after the last tick only exist on tmpfs; keep them
+        try:
+            _drain(final=True)
+        except Exception:
+            pass
+        if raw_dir != keep_dir:
+            # Anything still on tmpfs was never processed; move it, never delete it
+            try:
+                with os.scandir(raw_dir) as it:
+                    for e in it:
+                        _keep_raw(e.path)
+                os.rmdir(raw_dir)
+            except OSError:
+                pass
+
         with open(log_path, "a") as log_file:
             log_file.write(f"Capture loop finished at {datetime.now()}\n")
 
@@ -1191,6 +1741,7 @@ def ap_enable():
 
     print("[AP Control] Bringing up hotspot connection...")
     ok, out = _nmcli("con", "up", HOTSPOT_NAME)
+    _invalidate_net_caches()
     if not ok:
         print(f"[AP ERROR] 'nmcli con up {HOTSPOT_NAME}' failed: {out}")
     else:
@@ -1201,6 +1752,7 @@ def ap_disable():
     """Brings the hotspot connection down."""
     # Returns a tuple: (bool: success, str: message)
     ok, out = _nmcli("con", "down", HOTSPOT_NAME)
+    _invalidate_net_caches()
     if ok:
         return True, out
     
@@ -1307,6 +1859,9 @@ def index():
     encoding_active = _any_encoding_active()
     idle_now = ((_capture_thread is None or not _capture_thread.is_alive()) and not encoding_active)
 
+    # The two vcgencmd probes are subprocesses; let them run while we list sessions
+    temp_fut = _BG_EXEC.submit(_get_cpu_temp)
+    heat_fut = _BG_EXEC.submit(_has_overheated_since_boot)
     sessions = _list_sessions()
 
     # compute remaining seconds for active session if a duration was set
@@ -1335,17 +1890,20 @@ def index():
         next_sched = None
 
     disk_info = _disk_stats()
-    temp_info = _get_cpu_temp()
-    high_temp_warning = bool(_has_overheated_since_boot())
+    temp_info = _bg_result(temp_fut, None)
+    high_temp_warning = bool(_bg_result(heat_fut, False))
     background_status = _get_background_status()
 
-    return render_template_string(
+    return _render(
         TPL_INDEX,
         sessions=sessions,
         current_session=_current_session,
-        fps_choices=FPS_CHOICES,
         default_fps=DEFAULT_FPS,
+        fps_options=FPS_OPTIONS_HTML,
+        preset_options=PRESET_OPTIONS_HTML,
         interval_default=CAPTURE_INTERVAL_SEC,
+        jpeg_quality_default=TL_QUALITY,
+        jpeg_quality_hq=CAPTURE_QUALITY,
         remaining_sec=remaining_sec,
         remaining_min=remaining_min,
         remaining_sec_only=remaining_sec_only,
@@ -1379,42 +1937,45 @@ def start():
     duration_min = int(hr_str) * 60 + int(mn_str)
 
     quality = request.form.get("quality", "std")
+    # Blank means "per mode default" (TL_QUALITY for std, CAPTURE_QUALITY for hq/hybrid)
+    jq = (request.form.get("jpeg_quality") or "").strip()
+    try: jpeg_quality = max(10, min(100, int(jq))) if jq else None
+    except ValueError: jpeg_quality = None
 
+    _queue_start(interval, name, quality, duration_min, jpeg_quality)
+
+    # Redirect immediately. The UI will update via polling.
+    return redirect(url_for("index"))
+
+def _queue_start(interval, name="", quality="std", duration_min=0, jpeg_quality=None):
+    """Hand a manual start to the action processor (the only place captures start)."""
     payload = {'interval': interval, 'name': name, 'quality': quality}
+    if jpeg_quality:
+        payload['jpeg_quality'] = jpeg_quality
     if duration_min > 0:
         payload['duration_min'] = duration_min
-    
     _action_q.put(('start', payload))
-    
-    # Redirect immediately. The UI will update via polling.
-    return redirect(url_for("index"))
 
 def _stop_live_proc():
     global LIVE_PROC
     with LIVE_LOCK:
+        _live_bcast.stop()
         if LIVE_PROC and LIVE_PROC.poll() is None:
             try:
                 LIVE_PROC.terminate()
             except Exception:
                 pass
         LIVE_PROC = None
+    _invalidate_live_diag()
 
 
 def stop_timelapse():
-    global _stop_event, _capture_thread, _current_session
-    global _capture_stop_timer, _capture_end_ts, _capture_start_ts
+    global _capture_thread, _current_session
+    global _capture_end_ts, _capture_start_ts
 
     # Signal the capture thread to stop
     _stop_event.set()
 
-    # Clean up the auto-stop timer if it exists
-    if _capture_stop_timer:
-        try:
-            _capture_stop_timer.cancel()
-        except Exception:
-            pass
-        _capture_stop_timer = None
-
     # Add a check to ensure the thread exists before trying to join it
     if _capture_thread and _capture_thread.is_alive():
         _capture_thread.join(timeout=5.0)
@@ -1425,7 +1986,11 @@ def stop_timelapse():
     _capture_start_ts = None
     globals()['_capture_interval'] = None
     globals()['_capture_fps'] = None
-    _stop_event = threading.Event()
+    _invalidate_sessions_cache()   # drop the live-count overlay's stale base row
+    _notify_events()
+    # Reuse the one Event; leave it set if the thread somehow outlived the join
+    if not (_capture_thread and _capture_thread.is_alive()):
+        _stop_event.clear()
 
 @app.route("/stop", methods=["GET","POST"], endpoint="stop_route")
 def stop_route():
@@ -1434,7 +1999,7 @@ def stop_route():
             # Mark the schedule as manually stopped to prevent the scheduler from restarting it
             if _active_schedule_id in _schedules:
                 _schedules[_active_schedule_id]['manually_stopped'] = True
-                _save_sched_state()
+        _mark_sched_dirty()
 
     stop_timelapse()
     return redirect(url_for("index"))
@@ -1609,7 +2174,7 @@ def debug_rotation():
 @app.get("/still_preview/<filename>")
 def still_preview(filename):
     """Displays a single captured still with options."""
-    return render_template_string(TPL_STILL_PREVIEW, filename=filename)
+    return _render(TPL_STILL_PREVIEW, filename=filename)
 
 @app.get("/stills")
 def stills_gallery():
@@ -1621,7 +2186,7 @@ def stills_gallery():
         )
     except FileNotFoundError:
         files = []
-    return render_template_string(TPL_STILLS, stills=files)
+    return _render(TPL_STILLS, stills=files)
 
 @app.get("/stills_api")
 def stills_api():
@@ -1652,20 +2217,23 @@ def delete_still(filename):
         os.remove(os.path.join(STILLS_DIR, filename))
     except Exception as e:
         print(f"Error deleting still {filename}: {e}")
+    _invalidate_disk_cache()
     return redirect(url_for("stills_gallery"))
 
 @app.post("/delete_all_stills")
 def delete_all_stills():
     """Deletes all still images from the gallery."""
     try:
-        # Iterate over all files in the stills directory and remove them
-        for filename in os.listdir(STILLS_DIR):
-            file_path = os.path.join(STILLS_DIR, filename)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
+        # Iterate over all files in the stills directory and remove them;
+        # DirEntry.is_file() answers from the readdir type, without a stat per file
+        with os.scandir(STILLS_DIR) as it:
+            for e in it:
+                if e.is_file():
+                    os.remove(e.path)
         print("All still images have been deleted.")
     except Exception as e:
         print(f"Error deleting all stills: {e}")
+    _invalidate_disk_cache()
     # Redirect back to the now-empty gallery page
     return redirect(url_for("stills_gallery"))
 
@@ -1715,9 +2283,8 @@ def delete_past_schedules():
         # Delete the identified schedules
         for sid in ids_to_delete:
             _schedules.pop(sid, None)
-        
-        _save_sched_state()
-        
+
+    _mark_sched_dirty()
     return redirect(url_for("schedule_page"))
 
 @app.post("/rename/<sess>")
@@ -1734,6 +2301,7 @@ def rename(sess):
             os.rename(oldp, newp)
     except Exception:
         pass
+    _invalidate_sessions_cache()
     return redirect(url_for("index"))
 
 @app.post("/delete/<sess>")
@@ -1749,13 +2317,22 @@ def delete(sess):
             shutil.rmtree(p)
     except Exception:
         pass
+    _invalidate_sessions_cache()
     return redirect(url_for("index"))
 
 @app.get("/session/<sess>/preview")
 def preview(sess):
     p = _session_path(sess)
-    if not os.path.isdir(p): abort(404)
-    jpg = _session_latest_jpg(p)
+    st = _active_state
+    if sess == _current_session and st["name"] == sess and st["latest"]:
+        # Active capture: the capture thread already knows the newest frame
+        jpg = os.path.join(p, st["latest"])
+    else:
+        try:
+            latest = _scan_session(p)["latest"]
+        except OSError:
+            abort(404)
+        jpg = os.path.join(p, latest) if latest else None
     if not jpg:
         # tiny 1x1 gif
         data = b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x01\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
@@ -1763,50 +2340,77 @@ def preview(sess):
         resp.headers["Cache-Control"] = "no-store"
         return resp
 
+    try:
+        jpg_mtime_ns = os.stat(jpg).st_mtime_ns
+    except OSError:
+        abort(404)
+    final = True
     if GENERATE_THUMBS:
         tpath = _thumb_for(p, jpg)
-        path_to_send = tpath if os.path.exists(tpath) else jpg
+        try:
+            fresh = os.stat(tpath).st_mtime_ns >= jpg_mtime_ns
+        except OSError:
+            fresh = False
+        if fresh:
+            path_to_send = tpath
+        else:
+            _queue_thumb(jpg, tpath)   # full frame this time, thumbnail once it's ready
+            path_to_send = jpg
+            final = False
     else:
         path_to_send = jpg
-    resp = send_file(path_to_send, conditional=False)
-    resp.headers["Cache-Control"] = "no-store"
+    # The page versions preview URLs with ?ts=<frame name>-<mtime_ns>, so such a
+    # URL never changes content and the browser can keep it -- unless this is the
+    # full-frame stand-in for a queued thumbnail. Everything else revalidates,
+    # which costs a 304 rather than the JPEG.
+    if final and request.args.get("ts") == f"{os.path.basename(jpg)}-{jpg_mtime_ns}":
+        cache_control = "public, max-age=86400, immutable"
+    else:
+        cache_control = "no-cache"
+    if X_ACCEL_PREFIX:
+        # nginx serves the JPEG (and answers conditional requests) itself
+        resp = _x_accel_response(path_to_send)
+        resp.headers["Cache-Control"] = cache_control
+        return resp
+    # Frame names are monotonic, so name + mtime makes a cheap strong ETag
+    # and the browser revalidates with a 304 instead of re-downloading.
+    try:
+        st = os.stat(path_to_send)
+    except OSError:
+        abort(404)
+    resp = send_file(path_to_send, conditional=True,
+                     etag=f"{os.path.basename(path_to_send)}-{st.st_mtime_ns}",
+                     last_modified=st.st_mtime)
+    resp.headers["Cache-Control"] = cache_control
     return resp
 
 @app.post("/encode/<sess>")
 def encode(sess):
     if _any_encoding_active():
-        _jobs[sess] = {"status":"error","progress":0,"reason":"busy"}
+        _set_job(sess, {"status":"error","progress":0,"reason":"busy"})
         return redirect(url_for("index"))
         
     fps = request.form.get("fps", str(DEFAULT_FPS))
     try: fps = int(fps)
     except: fps = DEFAULT_FPS
     if fps not in FPS_CHOICES: fps = DEFAULT_FPS
+    preset = request.form.get("preset", DEFAULT_PRESET)
+    if preset not in ENCODE_PRESETS: preset = DEFAULT_PRESET
 
     sess_dir = _session_path(sess)
     if not os.path.isdir(sess_dir): abort(404)
     if not _enough_space(300):
-        _jobs[sess] = {"status":"error","progress":0,"reason":"low_disk"}
+        _set_job(sess, {"status":"error","progress":0,"reason":"low_disk"})
         return redirect(url_for("index"))
 
-    # If a video already exists, delete it before re-encoding
-    video_file = _video_path(sess_dir)
-    if os.path.exists(video_file):
-        try:
-            os.remove(video_file)
-        except OSError as e:
-            print(f"Error removing existing video file: {e}")
-            _jobs[sess] = {"status":"error","progress":0,"reason":"delete_failed"}
-            return redirect(url_for("index"))
-
     try:
         _stop_live_proc()
         _force_release_camera()
     except Exception:
         pass
 
-    _jobs[sess] = {"status":"queued","progress":0}
-    _encode_q.put((sess, fps))
+    _set_job(sess, {"status":"queued","progress":0})
+    _encode_q.put((sess, fps, preset))
     return redirect(url_for("index"))
 
 @app.post("/zip/<sess>")
@@ -1822,7 +2426,7 @@ def zip_session(sess):
     if existing.get("status") in ("queued", "zipping"):
         return redirect(url_for("index"))
 
-    _jobs[job_key] = {"status": "queued", "progress": 0}
+    _set_job(job_key, {"status": "queued", "progress": 0})
     _zip_q.put(sess)
     return redirect(url_for("index"))
 
@@ -1830,23 +2434,81 @@ def zip_session(sess):
 def schedule_cancel_compat():
     with _sched_lock:
         _schedules.clear()  # Simply clear the entire dictionary
-        _save_sched_state()
+    _mark_sched_dirty()
     return redirect(url_for("schedule_page"))
 
 @app.get("/jobs")
 def jobs():
+    return app.response_class(_jobs_body(), mimetype="application/json")
+
+def _jobs_body():
+    global _jobs_json
     # remove finished jobs older than a minute to avoid stale bars
-    for k,v in list(_jobs.items()):
-        if v.get("status") in ("done","error"):
-            # keep for a short grace; here we just leave it and let UI hide it
-            pass
-    return jsonify(_jobs)
+    cutoff = time.time() - JOB_EXPIRE_SEC
+    with _jobs_lock:
+        expired = [k for k, v in _jobs.items() if v.get("finished_ts", cutoff + 1) < cutoff]
+        for k in expired:
+            del _jobs[k]
+        # Serialize only when something changed; every other poll reuses the bytes
+        if expired or _jobs_json is None:
+            _jobs_json = _dumps(_jobs)
+        return _jobs_json
+
+@app.get("/events")
+def events():
+    """Server-sent events: pushes the /jobs, /disk and /session_status/<sess> payloads when they change."""
+    global _sse_clients
+    sess = request.args.get("sess", "")
+    with _events_cv:
+        if _sse_clients >= SSE_MAX_CLIENTS:
+            abort(503)  # the page falls back to polling
+        _sse_clients += 1
+
+    def stream():
+        global _sse_clients
+        sent = {}
+        seq = None
+        try:
+            while True:
+                with _events_cv:
+                    if seq == _events_seq:
+                        _events_cv.wait(SSE_KEEPALIVE_SEC)
+                    seq = _events_seq
+                out = []
+                payloads = [("jobs", _jobs_body()), ("disk", _dumps(_disk_stats()))]
+                if sess:
+                    payloads.append(("session", _dumps(_session_status(sess))))
+                for name, body in payloads:
+                    if sent.get(name) != body:
+                        sent[name] = body
+                        out.append(b"event: %s\ndata: %s\n\n" % (name.encode(), body))
+                # the comment line doubles as a keepalive and lets us notice closed clients
+                yield b"".join(out) or b": ping\n\n"
+        finally:
+            with _events_cv:
+                _sse_clients -= 1
+
+    resp = app.response_class(stream(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.get("/state")
+def state():
+    """/jobs, /disk and (with ?sess=) /session_status merged, for pages polling without /events."""
+    sess = request.args.get("sess", "")
+    body = b'{"jobs":' + _jobs_body() + b',"disk":' + _dumps(_disk_stats())
+    if sess:
+        body += b',"session":' + _dumps(_session_status(sess))
+    resp = app.response_class(body + b"}", mimetype="application/json")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
 
 @app.get("/download/<sess>")
 def download(sess):
     p = _video_path(_session_path(sess))
     if not os.path.exists(p): abort(404)
-    return send_file(p, as_attachment=True, download_name=f"{sess}.mp4")
+    return _send_session_file(p, f"{sess}.mp4")
 
 @app.get("/download_session_zip/<sess>")
 def download_session_zip(sess):
@@ -1864,11 +2526,11 @@ def download_session_zip(sess):
         abort(404, "ZIP not found. Create it first by clicking 'Zip images'.")
 
     # Serve directly from disk; avoid loading into memory
-    return send_file(zip_path, as_attachment=True, download_name=zip_name)
+    return _send_session_file(zip_path, zip_name)
 
 def _any_zipping_active():
     """Checks if any zip jobs are currently in the 'zipping' state."""
-    for key, value in _jobs.items():
+    for key, value in _jobs_snapshot().items():
         if key.startswith("zip:") and value.get("status") == "zipping":
             return True
     return False
@@ -1884,17 +2546,14 @@ def lcd_status():
 
         if active:
             sd = _session_path(_current_session)
-            if os.path.isdir(sd):
-                frames = len(glob.glob(os.path.join(sd, "*.jpg")))
-                # Read the quality setting for the active session
-                quality_file = os.path.join(sd, 'quality.json')
-                if os.path.exists(quality_file):
-                    try:
-                        with open(quality_file, 'r') as f:
-                            data = json.load(f)
-                            quality = data.get('quality', 'std')
-                    except Exception:
-                        pass # Keep default if file is corrupted
+            st = _active_state
+            if st["name"] == _current_session:
+                # Capture thread publishes count/quality; no directory scan while capturing
+                frames = st["count"]
+                quality = st["quality"]
+            elif os.path.isdir(sd):
+                scan = _scan_session(sd)
+                frames, quality = scan["count"], scan["quality"]
 
             start_ts = _capture_start_ts
             
@@ -1907,7 +2566,7 @@ def lcd_status():
         
         next_sched_info = _get_next_schedule()
 
-        return jsonify({
+        return _j({
             "active": active,
             "session": _current_session or "",
             "frames": frames,
@@ -1923,7 +2582,7 @@ def lcd_status():
         })
     except Exception:
         # never crash the LCD
-        return jsonify({
+        return _j({
             "active": False, "session": "", "frames": 0, "quality": "std",
             "start_ts": None, "end_ts": None, "encoding": False, "zipping": False,
             "disk": _disk_stats(), "next_sched": None, "live_idle": True,
@@ -1957,17 +2616,17 @@ def test_capture():
 @app.get("/live_status")
 def live_status():
     try:
-        return jsonify({"idle": _idle_now()})
+        return _j({"idle": _idle_now()})
     except Exception:
-        return jsonify({"idle": False})
+        return _j({"idle": False})
 @app.get("/live_debug")
 def live_debug():
-    vid_bin = shutil.which("rpicam-vid") or shutil.which("libcamera-vid")
+    vid_bin = CAMERA_VID
     proc = None
     with LIVE_LOCK:
         proc = LIVE_PROC
 
-    return jsonify({
+    return _j({
         "camera_warmed": _camera_warmed,
         "idle_now": _idle_now(),
         "live_proc": {
@@ -1987,7 +2646,7 @@ def live_mjpg():
     if not _idle_now():
         abort(503, "Busy")
 
-    vid_bin = shutil.which("libcamera-vid") or shutil.which("rpicam-vid")
+    vid_bin = CAMERA_VID
     if not vid_bin:
         abort(500, "No camera video binary found (libcamera-vid/rpicam-vid).")
 
@@ -1997,18 +2656,20 @@ def live_mjpg():
             _force_release_camera() # Clean up any stale processes first
             w, h = _dims_for_rotation()
 
+            # Extra camera buffers let the sensor keep streaming while the
+            # broadcaster thread is briefly descheduled, instead of dropping frames.
             def build_cmd(w, h):
                 base = os.path.basename(vid_bin)
                 rot = _rot_flags_for(vid_bin)
                 if base.startswith("libcamera-"):
                     return [
                         vid_bin, "-n", "--codec", "mjpeg", "--width", str(w), "--height", str(h),
-                        "--framerate", "30", *rot, "-t", "0", "-o", "-",
+                        "--framerate", "30", "--buffer-count", "6", *rot, "-t", "0", "-o", "-",
                     ]
                 else:
                     return [
                         vid_bin, "--nopreview", "--codec", "mjpeg", "--width", str(w), "--height", str(h),
-                        "--framerate", "30", *rot, "-t", "0", "-o", "-",
+                        "--framerate", "30", "--buffer-count", "6", *rot, "-t", "0", "-o", "-",
                     ]
 
             cmd = build_cmd(w, h)
@@ -2020,50 +2681,35 @@ def live_mjpg():
 
             LIVE_PROC = subprocess.Popen(
                 cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                bufsize=0, env=env
+                bufsize=-1, env=env
             )
             _trace(f"SPAWNED pid={LIVE_PROC.pid}")
 
             # Start a thread to drain stderr to prevent the process from blocking
             def _drain_stderr(p):
                 try:
-                    for line in iter(p.stderr.readline, b''):
+                    for line in _iter_lines(p.stderr):
                         if line: _live_last_stderr.append(line.decode('utf-8', 'ignore').strip())
                 except Exception: pass
             
             threading.Thread(target=_drain_stderr, args=(LIVE_PROC,), daemon=True).start()
+            _live_bcast.start(LIVE_PROC)
+
+    seen = _live_bcast.subscribe()
 
     def gen():
+        nonlocal seen
         _trace("GEN start")
-        # This generator reads from the single shared LIVE_PROC stdout
+        # Frames come from the broadcaster, which is the only reader of LIVE_PROC stdout.
+        # Frames that arrive while we are still sending are skipped, not queued.
         try:
-            while True:
-                if not _idle_now() or LIVE_PROC.poll() is not None:
-                    break
-                
-                # Find JPEG start and end markers (SOI, EOI)
-                # This is more robust for streaming MJPEG
-                soi = LIVE_PROC.stdout.read(2)
-                if soi != b'\xff\xd8':
-                    continue
-                
-                # Find the EOI marker
-                # Read chunks until we find the EOI
-                jpeg_data = soi
-                while True:
-                    chunk = LIVE_PROC.stdout.read(1024)
-                    jpeg_data += chunk
-                    eoi_pos = jpeg_data.find(b'\xff\xd9')
-                    if eoi_pos != -1:
-                        frame = jpeg_data[:eoi_pos+2]
-                        # Any data after EOI is part of the next frame, but we discard it
-                        # and resync to the next SOI for simplicity.
-                        break
-                
-                yield (b"--frame\r\n"
-                       b"Content-Type: image/jpeg\r\n"
-                       b"Content-Length: " + str(len(frame)).encode() + b"\r\n\r\n"
-                       + frame + b"\r\n")
+            while _idle_now():
+                seen, frame = _live_bcast.wait_frame(seen, timeout=5)
+                if frame is None:
+                    break  # stream ended or camera stalled
+                # Header and frame go out as separate chunks so the frame is never copied
+                yield _MJPEG_PART_HDR % len(frame)
+                yield frame
         finally:
             _trace("GEN cleanup - client disconnected")
             # Note: We DO NOT kill the process here.
@@ -2072,10 +2718,58 @@ def live_mjpg():
 
     headers = {
         "Content-Type": "multipart/x-mixed-replace; boundary=frame",
-        "Cache-Control": "no-store",
+        "Cache-Control": "no-store, no-transform",
+        "X-Accel-Buffering": "no",  # a buffering proxy would re-introduce the lag we skip frames to avoid
     }
-    return app.response_class(gen(), headers=headers)
+    resp = app.response_class(gen(), headers=headers)
+    resp.direct_passthrough = True   # gen() yields ready-made bytes; skip werkzeug's per-chunk encode pass
+    return resp
+
+
+# /live_diag probe results are cached briefly and shared by concurrent callers,
+# so a burst of failing /live clients opens the camera once, not once per request.
+_DIAG_TTL = 10.0
+_diag_lock = threading.Lock()
+_diag_cache = {"ts": 0.0, "result": None}
+_diag_inflight = None   # Event set when the running probe finishes
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+_CAM_ERR_TOKENS = ("failed to acquire camera", "busy", "in use")
 
+def _invalidate_live_diag():
+    with _diag_lock:
+        _diag_cache["result"] = None
+
+def _probe_camera(vid_bin):
+    """Open the camera for ~200ms and report whether it worked."""
+    try:
+        # Keep it short and quiet; add -n for libcamera-vid
+        cmd = [vid_bin, "--codec", "mjpeg", "-t", "200", "-o", "-"]
+        if os.path.basename(vid_bin) == "libcamera-vid":
+            cmd.insert(1, "-n")
+        p = subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            text=True, timeout=2.5
+        )
+        ok = (p.returncode == 0)
+        err = (p.stderr or "").strip()
+    except subprocess.TimeoutExpired:
+        return {"ok": False, "bin": vid_bin, "reason": "Camera init exceeded 2.5s (slow startup)."}
+    except Exception as e:
+        return {"ok": False, "bin": vid_bin, "reason": str(e)}
+
+    # Compact reason: the camera-busy line if there is one, else the last line.
+    # Only the tail matters, so don't run the regex over a long log.
+    reason = ""
+    if err:
+        lines = [ln.strip() for ln in _ANSI_RE.sub("", err[-4096:]).splitlines() if ln.strip()]
+        for ln in reversed(lines):
+            low = ln.lower()
+            if any(tok in low for tok in _CAM_ERR_TOKENS):
+                reason = ln
+                break
+        else:
+            reason = lines[-1] if lines else ""
+    return {"ok": ok, "bin": vid_bin, "reason": reason, "noninvasive": False}
 
 @app.get("/live_diag")
 def live_diag():
@@ -2085,8 +2779,9 @@ def live_diag():
       Just report that it's already running.
     - Only when no preview process is running do we try a short probe.
     """
+    global _diag_inflight
     # Prefer rpicam-vid, then libcamera-vid
-    vid_bin = shutil.which("rpicam-vid") or shutil.which("libcamera-vid")
+    vid_bin = CAMERA_VID
 
     with LIVE_LOCK:
         running = bool(LIVE_PROC and LIVE_PROC.poll() is None)
@@ -2105,30 +2800,31 @@ def live_diag():
         return jsonify({"probe": {"ok": False, "bin": None,
                                   "reason": "No rpicam-vid/libcamera-vid installed"}})
 
-    try:
-        # Keep it short and quiet; add -n for libcamera-vid
-        cmd = [vid_bin, "--codec", "mjpeg", "-t", "200", "-o", "-"]
-        if os.path.basename(vid_bin) == "libcamera-vid":
-            cmd.insert(1, "-n")
-        p = subprocess.run(
-            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
-            text=True, timeout=2.5
-        )
-        ok = (p.returncode == 0)
-        err = (p.stderr or "").strip()
-    except subprocess.TimeoutExpired:
-        return jsonify({"probe": {"ok": False, "bin": vid_bin,
-                                  "reason": "Camera init exceeded 2.5s (slow startup)."}})
-    except Exception as e:
-        return jsonify({"probe": {"ok": False, "bin": vid_bin, "reason": str(e)}})
+    with _diag_lock:
+        if _diag_cache["result"] is not None and time.monotonic() - _diag_cache["ts"] < _DIAG_TTL:
+            return jsonify({"probe": _diag_cache["result"]})
+        done = _diag_inflight
+        if done is None:
+            done = _diag_inflight = threading.Event()
+            owner = True
+        else:
+            owner = False
 
-    # Return last line as a compact reason
-    reason = ""
-    if err:
-        lines = [ln.strip() for ln in err.splitlines() if ln.strip()]
-        if lines:
-            reason = lines[-1]
-    return jsonify({"probe": {"ok": ok, "bin": vid_bin, "reason": reason, "noninvasive": False}})
+    if owner:
+        result = None
+        try:
+            result = _probe_camera(vid_bin)
+        finally:
+            with _diag_lock:
+                if result is not None:
+                    _diag_cache.update(ts=time.monotonic(), result=result)
+                _diag_inflight = None
+            done.set()
+    else:
+        # Someone else is already probing; share their verdict
+        done.wait(5)
+        result = _diag_cache["result"] or {"ok": False, "bin": vid_bin, "reason": "Probe still running."}
+    return jsonify({"probe": result})
 
 @app.route("/live_kill", methods=["GET","POST"])
 def live_kill():
@@ -2138,7 +2834,9 @@ def live_kill():
 
 @app.get("/live")
 def live_page():
-    return render_template_string(r"""
+    return _render(TPL_LIVE)
+
+TPL_LIVE = r"""
 <!doctype html>
 <meta name="viewport" content="width=device-width, initial-scale=1" />
 <title>Live View</title>
@@ -2212,7 +2910,7 @@ fetch("{{ url_for('debug_rotation') }}")
     }, 50);
   });
 </script>
-    """)
+"""
 
 # ---------- Template (single file) ----------
 TPL_INDEX = r"""
@@ -2419,6 +3117,11 @@ TPL_INDEX = r"""
       <input name="duration_hours" type="number" min="0" step="1" placeholder="hrs" style="width:60px">
       <input name="duration_minutes" type="number" min="0" step="1" placeholder="mins" style="width:60px">
     </div>
+    <div class="row">
+      <label>🗜 JPEG quality:</label>
+      <input name="jpeg_quality" type="number" min="10" max="100" step="1" placeholder="auto" style="width:70px"
+             title="Blank: {{ jpeg_quality_default }} for Standard, {{ jpeg_quality_hq }} for High Quality / Hybrid">
+    </div>
     <div class="row">
         <label>Image Quality:</label>
         <label style="font-weight:normal; display:flex; align-items:center; gap:4px;" title="Captures High Quality images and also creates Standard copies for on-device video encoding.">
@@ -2472,7 +3175,7 @@ TPL_INDEX = r"""
   <div class="card session {% if current_session == s.name %}active{% endif %}">
     <div class="thumb">
       {% if s.has_frame %}
-        <img id="preview-{{ s.name }}" src="{{ url_for('preview', sess=s.name) }}?ts={{ s.latest }}" alt="preview" loading="lazy">
+        <img id="preview-{{ s.name }}" src="{{ url_for('preview', sess=s.name) }}?ts={{ s.latest_ver }}" alt="preview" loading="lazy">
       {% else %}
         <div id="preview-placeholder-{{ s.name }}" class="placeholder">⏳ capturing…</div>
       {% endif %}
@@ -2505,11 +3208,8 @@ TPL_INDEX = r"""
         {% if s.quality in ('std', 'hybrid') %}
         <form action="{{ url_for('encode', sess=s.name) }}" method="post" onsubmit="showProgress('{{ s.name }}')">
           <label>🎞 FPS:</label>
-            <select name="fps" {% if encoding_active %}disabled{% endif %}>
-              {% for f in fps_choices %}
-                <option value="{{ f }}" {% if f == default_fps %}selected{% endif %}>{{ f }}</option>
-              {% endfor %}
-            </select>
+            <select name="fps" {% if encoding_active %}disabled{% endif %}>{{ fps_options }}</select>
+            <select name="preset" {% if encoding_active %}disabled{% endif %}>{{ preset_options }}</select>
           {% if not s.has_video %}
             <button class="btn" type="submit">🧩 Encode</button>
           {% else %}
@@ -2575,6 +3275,59 @@ TPL_INDEX = r"""
     {% if background_status %}  <div class="status" id="background-status">{{ background_status }}</div> {% endif %} </div>
 </div>
 </main>
+<script>
+// --- One /events stream feeds the jobs / disk / active-session updaters below ---
+// If EventSource is unsupported or the server turns the stream away (503 when
+// busy), fall back to polling /state, which returns the same payloads in one JSON.
+const serverEvents = (function(){
+  const POLL_MS = 1000;
+  const handlers = {};
+  const sess = {{ (current_session or '')|tojson }};
+  const qs = sess ? '?sess=' + encodeURIComponent(sess) : '';
+  let es = null, polling = false, ctrl = null;
+
+  async function pollAll(){
+    if (document.hidden) return;
+    if (ctrl) ctrl.abort();
+    ctrl = new AbortController();
+    try {
+      const r = await fetch({{ url_for('state')|tojson }} + qs, {cache:'no-store', signal: ctrl.signal});
+      if (!r.ok) return;
+      const st = await r.json();
+      for (const k in st) if (handlers[k]) handlers[k](st[k]);
+    } catch(_){}
+  }
+  function startPolling(){
+    if (polling) return;
+    polling = true;
+    if (es) { es.close(); es = null; }
+    pollAll();
+    setInterval(pollAll, POLL_MS);
+    // Don't queue fetches while the tab is in the background
+    document.addEventListener('visibilitychange', () => {
+      if (document.hidden) { if (ctrl) ctrl.abort(); } else pollAll();
+    });
+  }
+
+  if (window.EventSource) {
+    es = new EventSource({{ url_for('events')|tojson }} + qs);
+    es.addEventListener('error', () => { if (es && es.readyState === EventSource.CLOSED) startPolling(); });
+  } else {
+    document.addEventListener('DOMContentLoaded', startPolling);
+  }
+  return {
+    on(name, onData){
+      handlers[name] = onData;
+      if (es) es.addEventListener(name, e => { try { onData(JSON.parse(e.data)); } catch(_){} });
+    }
+  };
+})();
+serverEvents.on('disk', d => {
+  const t = document.getElementById('disk-text'), f = document.getElementById('disk-fill');
+  if (t) t.textContent = `Storage: ${d.free_gb}GB free of ${d.total_gb}GB (${100 - d.pct_free}% used)`;
+  if (f) f.style.width = (100 - d.pct_free) + '%';
+});
+</script>
 {% if current_session %}
 <script>
 // --- Active session updater (preview, frames, time, progress, interval, fps) ---
@@ -2652,7 +3405,9 @@ TPL_INDEX = r"""
         imgEl = img;
       }
       if (imgEl) {
-        imgEl.src = base + '?t=' + Date.now();
+        // Cache-bust on the newest frame's name + mtime only, so unchanged frames hit 304
+        const next = base + '?ts=' + encodeURIComponent(st.latest_ver || '');
+        if (imgEl.getAttribute('src') !== next) imgEl.src = next;
       }
     } else {
       if (!document.getElementById('active-preview-placeholder')) {
@@ -2669,17 +3424,18 @@ TPL_INDEX = r"""
     }
   }
 
-  async function pollActiveCard(){
-    try{
-      const r = await fetch({{ url_for('session_status', sess='__X__') | tojson }}.replace('__X__', encodeURIComponent(sess)), {cache:'no-store'});
-      if (!r.ok) return;
-      const st = await r.json();
-      updateActive(st);
-    }catch(_){}
+  // Coalesce pushes and ticks into at most one paint per animation frame;
+  // rAF callbacks are also held back while the tab is hidden.
+  let lastSt = null, paintQueued = false;
+  function paint(){
+    if (paintQueued) return;
+    paintQueued = true;
+    requestAnimationFrame(() => { paintQueued = false; updateActive(lastSt); });
   }
+  function applyActive(st){ lastSt = st; paint(); }
 
   // Initial paint using server-provided values
-  updateActive({
+  applyActive({
     active:true,
     frames:0,
     remaining_sec: {{ remaining_sec if remaining_sec is not none else 'null' }},
@@ -2688,8 +3444,9 @@ TPL_INDEX = r"""
     interval: {{ active_interval if active_interval is not none else 'null' }},
     fps:      {{ active_fps if active_fps is not none else 'null' }},
   });
-  setInterval(pollActiveCard, 1000);
-  pollActiveCard();
+  serverEvents.on('session', applyActive);
+  // Pushes only arrive per frame; keep the elapsed/remaining time ticking locally
+  setInterval(() => { if (!document.hidden) paint(); }, 1000);
 })();
 </script>
 {% endif %}
@@ -2721,16 +3478,9 @@ TPL_INDEX = r"""
 {% endif %}
 <script>
 (function() {
-    const POLL_MS = 1500;
     const isCaptureActive = {{ 'true' if current_session else 'false' }};
 
-    async function poll() {
-        let jobs = null;
-        try {
-            const r = await fetch("{{ url_for('jobs') }}", { cache: 'no-store' });
-            if (r.ok) jobs = await r.json();
-        } catch (e) { /* ignore network errors */ }
-
+    function applyJobs(jobs) {
         let anyEncodingActive = false;
         // THE FIX: Check for ANY active zip job, just like we do for encoding.
         let anyZippingActive = false;
@@ -2808,8 +3558,10 @@ TPL_INDEX = r"""
                 }
             }
             if (zipDownloadBtn) {
-                const shouldShowZip = zipJob && zipJob.status === 'done';
-                zipDownloadBtn.style.display = (shouldShowZip && !isZippingThisSession) ? 'inline-flex' : 'none';
+                // Finished zip jobs expire server-side, so only override the
+                // rendered visibility while a job for this session exists.
+                if (isZippingThisSession) zipDownloadBtn.style.display = 'none';
+                else if (zipJob && zipJob.status === 'done') zipDownloadBtn.style.display = 'inline-flex';
             }
 
             // --- Update Other Action Buttons (Delete, Rename) ---
@@ -2820,8 +3572,7 @@ TPL_INDEX = r"""
         });
     }
 
-    setInterval(poll, POLL_MS);
-    poll(); // Initial call
+    serverEvents.on('jobs', applyJobs);
 })();
 </script>
 <script>
@@ -2959,12 +3710,17 @@ TPL_STILL_PREVIEW = r"""
 """
 
 # ======== Simple Scheduler ========
-import threading, time, urllib.request, urllib.parse
-
-_sched_lock = threading.Lock()
-_sched_state = {}       # {'start_ts': int, 'end_ts': int, 'interval': int, 'fps': int}
-_sched_start_t = None   # handle to the scheduled start timer
-_sched_stop_t  = None   # handle to the scheduled stop timer
+_sched_human_cache = {}   # epoch seconds -> "Mon 2025-01-06 14:30"
+
+def _sched_human(ts):
+    """Format a schedule boundary for display; the few distinct values are formatted once."""
+    ts = int(ts)
+    h = _sched_human_cache.get(ts)
+    if h is None:
+        if len(_sched_human_cache) > 256:
+            _sched_human_cache.clear()
+        h = _sched_human_cache[ts] = time.strftime("%a %Y-%m-%d %H:%M", time.localtime(ts))
+    return h
 
 def _get_next_schedule():
     """Return a dict for the next (or currently active) schedule, or None."""
@@ -2972,7 +3728,7 @@ def _get_next_schedule():
     
     # Only consider schedules that haven't ended more than 60 seconds ago.
     # This grace period gives the stop logic a chance to fire.
-    upcoming = [(sid, st) for sid, st in _schedules.items()
+    upcoming = [(sid, st) for sid, st in _sched_snapshot()
                 if int(st.get("end_ts", 0)) > now - 60]
     
     if not upcoming:
@@ -2987,8 +3743,8 @@ def _get_next_schedule():
 
     sid, st = sorted(upcoming, key=_key)[0]
     try:
-        start_h = datetime.fromtimestamp(int(st["start_ts"])).strftime("%a %Y-%m-%d %H:%M")
-        end_h   = datetime.fromtimestamp(int(st["end_ts"])).strftime("%a %Y-%m-%d %H:%M")
+        start_h = _sched_human(st["start_ts"])
+        end_h   = _sched_human(st["end_ts"])
     except Exception:
         start_h = end_h = "?"
 
@@ -3004,9 +3760,26 @@ def _get_next_schedule():
         "active_now": int(st.get("start_ts", 0)) <= now < int(st.get("end_ts", 0)),
     }
 
+_DISK_TTL = 5.0
+_disk_cache = {}   # path -> (monotonic ts, shutil.disk_usage result)
+
+def _disk_usage(path):
+    """shutil.disk_usage(path), shared by all callers for up to _DISK_TTL seconds."""
+    hit = _disk_cache.get(path)
+    now = time.monotonic()
+    if hit and now - hit[0] < _DISK_TTL:
+        return hit[1]
+    usage = shutil.disk_usage(path)
+    _disk_cache[path] = (now, usage)
+    return usage
+
+def _invalidate_disk_cache():
+    """Call after freeing or writing a lot of data so the UI shows it right away."""
+    _disk_cache.clear()
+
 def _disk_stats(path=BASE):
     """Return total/used/free and percents for the filesystem containing `path`."""
-    st = shutil.disk_usage(path)
+    st = _disk_usage(path)
     total = st.total
     free  = st.free
     used  = total - free
@@ -3028,30 +3801,48 @@ def _thumb_for(sess_dir, jpg_path):
     return os.path.join(tdir, os.path.basename(jpg_path))
 
 def _make_thumb(src_jpg, dst_jpg, width=320):
-    # use ffmpeg to generate a small preview; very light
-    cmd = [FFMPEG, "-y", "-i", src_jpg, "-vf", f"scale={width}:-1", "-q:v", "5", dst_jpg]
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Pillow in-process: no ffmpeg spawn, and draft() lets libjpeg decode at 1/2..1/8 scale
+    tmp = dst_jpg[:-4] + ".tmp.jpg"   # previews must never see a half-written thumb
+    try:
+        with Image.open(src_jpg) as im:
+            size = (width, max(1, im.height * width // im.width))   # like scale=<width>:-1
+            # asking for the real target size (not width x width) lets draft pick 1/4 or 1/8
+            im.draft("RGB", size)
+            im = im.convert("RGB")
+            im.thumbnail(size, Image.Resampling.BILINEAR)
+            im.save(tmp, "JPEG", quality=80)
+    except Exception:
+        # Pillow refuses some damaged frames that ffmpeg still decodes
+        cmd = [FFMPEG, "-y", "-i", src_jpg, "-vf", f"scale={width}:-1", "-q:v", "5", tmp]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.replace(tmp, dst_jpg)
+
+_thumbs_pending = set()
+_thumbs_lock = threading.Lock()
+
+def _queue_thumb(src_jpg, dst_jpg):
+    """Render a thumbnail on _BG_EXEC, at most once per target at a time."""
+    with _thumbs_lock:
+        if dst_jpg in _thumbs_pending:
+            return
+        _thumbs_pending.add(dst_jpg)
+
+    def run():
+        try:
+            _make_thumb(src_jpg, dst_jpg, THUMB_WIDTH)
+        except Exception as e:
+            print(f"[thumb] failed for {src_jpg}: {e}")
+        finally:
+            with _thumbs_lock:
+                _thumbs_pending.discard(dst_jpg)
 
-def _free_mb(path):
-    st = shutil.disk_usage(path)
-    return int(st.free / (1024 * 1024))
+    _BG_EXEC.submit(run)
 
 def _enough_space(required_mb=500):
-    # Require at least this many MB free before we start or encode
-    return _free_mb(SESSIONS_DIR) >= required_mb
+    # Require at least this many MB free before we start or encode.
+    # st.free is statvfs f_bavail*f_frsize; compare in bytes, no MB conversion.
+    return _disk_usage(SESSIONS_DIR).free >= required_mb << 20
 
-def _sched_http_post(path, data=None, timeout=5):
-    try:
-        url = f"http://127.0.0.1:5050{path}"
-        if data is None: 
-            data = {}
-        payload = urllib.parse.urlencode(data).encode()
-        req = urllib.request.Request(url, data=payload, method="POST")
-        urllib.request.urlopen(req, timeout=timeout).read(1)
-        return True
-    except Exception:
-        return False
-    
 def _get_cpu_temp():
     """Reads the CPU temperature and returns it as a string, or None on error."""
     try:
@@ -3066,8 +3857,6 @@ def _get_cpu_temp():
         print(f"Error reading CPU temp: {e}")
         return None
 
-import subprocess
-
 def _has_overheated_since_boot():
     """Return True if the Pi firmware reports *overheating* since last boot."""
     try:
@@ -3132,15 +3921,6 @@ def qr_info():
 
 
 # ================== Simple Scheduler (ASCII-safe, single copy) ==================
-import threading, time
-from datetime import datetime
-from flask import render_template_string, request, redirect, url_for
-
-# _sched_lock = threading.Lock()
-# _sched_state = {}        # {'start_ts': int, 'end_ts': int, 'interval': int, 'fps': int}
-# _sched_start_t = None    # threading.Timer
-# _sched_stop_t  = None
-
 SCHED_TPL = '''<!doctype html>
 <meta name="viewport" content="width=device-width, initial-scale=1">
 <title>Schedules</title>
@@ -3157,9 +3937,11 @@ SCHED_TPL = '''<!doctype html>
   .danger{background:#f06767;color:#fff;border:0;border-radius:10px;text-decoration:none;}
   .link{padding:8px 12px;background:#eee;border-radius:10px;text-decoration:none;color:#111}
   .full{width:100%}
+  .error{color:#b91c1c;font-weight:600;margin-bottom:10px}
 </style>
 
 <h2>Create a new schedule</h2>
+{% if error %}<div class="error">{{ error }}</div>{% endif %}
 <form method="post" action="{{ url_for('schedule_arm') }}">
   <label>Start (local time)</label>
   <input type="datetime-local" name="start_local" required>
@@ -3171,11 +3953,7 @@ SCHED_TPL = '''<!doctype html>
   <label>Interval (seconds)</label>
   <input type="number" name="interval" value="{{ interval_default }}" min="1">
   <label>FPS</label>
-  <select name="fps">
-    {% for f in fps_choices %}
-      <option value="{{ f }}" {% if f == default_fps %}selected{% endif %}>{{ f }}</option>
-    {% endfor %}
-  </select>
+  <select name="fps">{{ fps_options }}</select>
     <label>Image Quality</label>
     <div class="row">
         <label style="font-weight:normal; display:flex; align-items:center; gap:4px;" title="Captures High Quality images and also creates Standard copies for on-device video encoding.">
@@ -3259,45 +4037,6 @@ SCHED_TPL = '''<!doctype html>
 </script>
 '''
 
-def _sched_fire_start(interval, fps, sess_name=""):
-    try:
-        from flask import current_app
-        app = current_app._get_current_object()
-    except Exception:
-        app = globals().get('app')
-    if not app:
-        return
-    with app.app_context():
-        with app.test_client() as c:
-            c.post('/start', data={'interval': interval, 'fps': fps, 'name': sess_name})
-
-def _sched_fire_stop(sess_name="", fps=24, auto_encode=False):
-    # This function runs in a background timer thread.
-    # It's more reliable to call our app's functions directly
-    # than to simulate HTTP requests.
-
-    # First, get the name of the session that is currently running.
-    session_to_stop = _current_session
-
-    # Only proceed if there is an active session.
-    if not session_to_stop:
-        return
-
-    # Now, stop the timelapse.
-    stop_timelapse()
-
-    # Wait a moment for the stop to fully process.
-    time.sleep(1.5)
-
-    # If auto-encode is enabled for this schedule, queue the job.
-    if auto_encode:
-        # Check if the session that was stopped is the one we expected
-        # or if a session name was passed from the schedule.
-        session_to_encode = session_to_stop or sess_name
-        if session_to_encode:
-            print(f"[schedule] Auto-encoding session {session_to_encode} at {fps}fps")
-            _encode_q.put((session_to_encode, fps))
-
 @app.after_request
 def _no_store_for_diag(resp):
     if request.path in ("/live_diag", "/live_status", "/live_debug"):
@@ -3306,26 +4045,33 @@ def _no_store_for_diag(resp):
 
 @app.get("/disk")
 def disk():
-    return jsonify(_disk_stats())
+    # _disk_stats() is already served from the _DISK_TTL cache; let clients reuse it briefly too
+    resp = _j(_disk_stats())
+    resp.headers["Cache-Control"] = "max-age=1"
+    return resp
 
 @app.get("/schedule")
 def schedule_page():
+    return _render_schedule_page()
+
+def _render_schedule_page(error=None):
     # build view models for upcoming/active and past schedules
     now_ts = int(time.time())
     upcoming_schedules = []
     past_schedules = []
     
-    sorted_items = sorted(_schedules.items(), key=lambda kv: kv[1].get("start_ts", 0))
+    # Copy under the lock: the scheduler and the arm/cancel routes mutate _schedules
+    sorted_items = sorted(_sched_snapshot(), key=lambda kv: kv[1].get("start_ts", 0))
     
     for sid, st in sorted_items:
         try:
-            start_h = datetime.fromtimestamp(int(st["start_ts"])).strftime("%a %Y-%m-%d %H:%M")
-            end_h   = datetime.fromtimestamp(int(st["end_ts"])).strftime("%a %Y-%m-%d %H:%M")
+            start_h = _sched_human(st["start_ts"])
+            end_h   = _sched_human(st["end_ts"])
         except Exception:
             start_h = end_h = "?"
         
-        # Create a view model object
-        vm = dict(st)
+        # Create a view model object (st is already a private copy)
+        vm = st
         vm["start_h"] = start_h
         vm["end_h"]   = end_h
         
@@ -3335,31 +4081,34 @@ def schedule_page():
         else:
             upcoming_schedules.append((sid, vm))
 
-    return render_template_string(
+    return _render(
         SCHED_TPL,
-        fps_choices=globals().get("FPS_CHOICES", [10, 24, 30]),
-        default_fps=globals().get("DEFAULT_FPS", 24),
-        interval_default=globals().get("CAPTURE_INTERVAL_SEC", 10),
+        fps_options=FPS_OPTIONS_HTML,
+        interval_default=CAPTURE_INTERVAL_SEC,
         schedules=upcoming_schedules,
-        past_schedules=past_schedules # Pass the new list to the template
+        past_schedules=past_schedules, # Pass the new list to the template
+        error=error,
     )
 
+def _parse_local_minute(s):
+    """Parse a datetime-local value ("YYYY-MM-DDTHH:MM") by slicing, without strptime."""
+    if len(s) != 16 or s[4] != "-" or s[7] != "-" or s[10] != "T" or s[13] != ":":
+        raise ValueError(f"not a datetime-local value: {s!r}")
+    return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]))
+
+def _form_int(s, default):
+    """Non-negative int from a form field, or `default` for blank/malformed input (no exception)."""
+    s = (s or "").strip()
+    return int(s) if s.isdecimal() else default
+
 @app.post("/schedule/arm")
 def schedule_arm():
     start_local = request.form.get("start_local", "").strip()
-    hr_str  = request.form.get("duration_hr",  "0") or "0"
-    min_str = request.form.get("duration_min", "0") or "0" # <-- THE FIX IS HERE
-
-    try: dur_hr = int(hr_str.strip())
-    except: dur_hr = 0
-    try: dur_min = int(min_str.strip())
-    except: dur_min = 0
-    duration_min = max(1, dur_hr * 60 + dur_min)
-
-    try: interval = int(request.form.get("interval", "10") or 10)
-    except: interval = 10
-    try: fps = int(request.form.get("fps", "24") or 24)
-    except: fps = 24
+    form = request.form
+    duration_min = max(1, _form_int(form.get("duration_hr"), 0) * 60
+                          + _form_int(form.get("duration_min"), 0))
+    interval = _form_int(form.get("interval"), 10)
+    fps = _form_int(form.get("fps"), 24)
     
     auto_encode = bool(request.form.get("auto_encode"))
     sess_name = (request.form.get("sess_name") or "").strip()
@@ -3371,17 +4120,18 @@ def schedule_arm():
     try:
         # Use a timezone-aware conversion to avoid DST bugs
         local_tz = pytz.timezone('Europe/London')
-        start_dt = local_tz.localize(datetime.strptime(start_local, "%Y-%m-%dT%H:%M"))
+        start_dt = local_tz.localize(_parse_local_minute(start_local))
         start_ts = int(start_dt.timestamp())
-        end_ts = start_ts + duration_min * 60
     except Exception:
-        # Fallback to current time + 1 minute if there is an error
-        start_ts = int(time.time()) + 60
-        end_ts = start_ts + duration_min * 60
+        # Reject before touching _schedules, so nothing is armed or persisted
+        return _render_schedule_page("Could not read the start time."), 400
+    end_ts = start_ts + duration_min * 60
 
     sid = uuid.uuid4().hex[:8]
     now_ts = int(time.time())
-    
+    if end_ts <= now_ts:
+        return _render_schedule_page("That schedule would already have ended."), 400
+
     with _sched_lock:
         _schedules[sid] = dict(
             start_ts=start_ts, end_ts=end_ts,
@@ -3390,7 +4140,8 @@ def schedule_arm():
             quality=quality,
             created_ts=now_ts,
         )
-        _save_sched_state()
+        _sched_cv.notify()
+    _mark_sched_dirty()
 
     return redirect(url_for("schedule_page"))
 
@@ -3398,7 +4149,7 @@ def schedule_arm():
 def schedule_cancel_id(sid):
     with _sched_lock:
         _schedules.pop(sid, None)
-        _save_sched_state()
+    _mark_sched_dirty()
     return redirect(url_for("schedule_page"))
 
 @app.get("/schedule/list")
@@ -3412,9 +4163,8 @@ def schedule_list_json():
     """
     now = int(time.time())
     items = []
-    for sid, st in _schedules.items():
+    for sid, d in _sched_snapshot():
         try:
-            d = dict(st)
             d["id"] = sid
             # normalize types
             d["start_ts"] = int(d.get("start_ts", 0))
@@ -3428,7 +4178,7 @@ def schedule_list_json():
         items.append(d)
 
     items.sort(key=lambda d: d.get("start_ts", 0))
-    resp = jsonify(items)
+    resp = _j(items)
     resp.headers["Cache-Control"] = "no-store"
     return resp
 
@@ -3445,27 +4195,25 @@ def schedule_delete_json():
         return ("missing id", 400)
 
     with _sched_lock:
-        # stop timers and remove
-        _cancel_timers_for(sid)
+        # The scheduler thread re-reads _schedules on every wake, so removing the entry is enough
         _schedules.pop(sid, None)
-        _save_sched_state()
+    _mark_sched_dirty()
     return ("", 204)
 
 # ================== /Simple Scheduler ==================
-# Load persisted schedule and re-arm timers on process start
-try:
-    if _load_sched_state():
-        _arm_timers_all()
-except Exception:
-    pass
+# Load persisted schedules on process start; _scheduler_thread picks them up
+_load_sched_state()
 
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", "5050"))
-    app.run(host="0.0.0.0", port=port, threaded=True, use_reloader=False)
-
-
-
-# # ---------- Main ----------
-# if __name__ == "__main__":
-#     app.run(host="0.0.0.0", port=5050)
\ No newline at end of file
+    try:
+        # Production WSGI server when installed; live MJPEG clients each hold a thread
+        from waitress import serve
+    except ImportError:
+        app.run(host="0.0.0.0", port=port, threaded=True, use_reloader=False)
+    else:
+        # /events and /live.mjpg streams each pin a thread for as long as they are
+        # open, so reserve those on top of the pool that serves ordinary requests.
+        threads = (int(os.environ.get("WSGI_THREADS", "8")) + SSE_MAX_CLIENTS
+                   + int(os.environ.get("LIVE_MAX_CLIENTS", "2")))
+        serve(app, host="0.0.0.0", port=port, threads=threads)